@@ -0,0 +1,170 @@
+# Copyright 2025 Shreya Kamalapurkar
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# data/batch.py
+# Generate many posts at once (e.g. a content calendar):
+#   python data/batch.py specs.csv -o posts.jsonl --concurrency 8
+# Specs may name a tenant; --tenant sets the default for specs that don't.
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import json
+import time
+from pathlib import Path
+
+from llm_helper import with_retries
+from post_generator import agenerate_post, parse_spec
+
+def _count(value) -> int:
+    if value is None or value == "":
+        return 1
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError("count must be a whole number")
+    try:
+        count = int(value)
+    except ValueError:
+        raise ValueError("count must be a whole number") from None
+    if count < 0:
+        raise ValueError("count must be 0 or more")
+    return count
+
+def load_specs(path: str | Path, tenant: str | None = None) -> list[dict]:
+    """
+    Read generation specs from JSONL or CSV. Each spec has length, language,
+    tag (or title), an optional count (default 1) and an optional tenant
+    (default: tenant). Rows are validated like API requests; ValueError lists
+    every bad row, so nothing is generated from a half-valid file.
+    """
+    path = Path(path)
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.suffix.lower() == ".csv":
+            rows = [(n, row) for n, row in enumerate(csv.DictReader(f), start=2)]
+        else:
+            rows = []
+            for n, line in enumerate(f, start=1):
+                if line.strip():
+                    try:
+                        rows.append((n, json.loads(line)))
+                    except json.JSONDecodeError as e:
+                        rows.append((n, ValueError(f"invalid JSON: {e}")))
+    specs, errors = [], []
+    for n, row in rows:
+        try:
+            if isinstance(row, Exception):
+                raise row
+            if not isinstance(row, dict):
+                raise ValueError("expected a JSON object")
+            spec = parse_spec({
+                # empty CSV cells mean "use the default"
+                "length": row.get("length") or "Medium",
+                "language": row.get("language") or "English",
+                "tag": row.get("tag") or row.get("title"),
+                "tenant": row.get("tenant") or tenant,
+            })
+            spec["count"] = _count(row.get("count"))
+        except ValueError as e:
+            errors.append(f"{path.name}:{n}: {e}")
+            continue
+        specs.append(spec)
+    if errors:
+        raise ValueError("invalid specs:\n  " + "\n  ".join(errors))
+    return specs
+
+def _expand(specs: list[dict]) -> list[dict]:
+    """One job per post; ids are stable across runs so output can be resumed."""
+    jobs, seen = [], {}
+    for spec in specs:
+        tenant = spec.get("tenant")
+        base = f"{spec['tag']}/{spec['length']}/{spec['language']}"
+        if tenant:
+            base = f"{tenant}:{base}"
+        for _ in range(spec.get("count", 1)):
+            n = seen.get(base, 0)
+            seen[base] = n + 1
+            jobs.append({"id": f"{base}#{n}", "length": spec["length"],
+                         "language": spec["language"], "tag": spec["tag"], "tenant": tenant})
+    return jobs
+
+def _done_ids(out_path: Path) -> set[str]:
+    done = set()
+    if out_path.exists():
+        with open(out_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "post" in record:
+                    done.add(record["id"])
+    return done
+
+async def agenerate_posts(specs: list[dict], out_path: str | Path,
+                          concurrency: int = 8, max_retries: int = 3) -> dict:
+    """
+    Generate every post described by specs, appending one JSON line per post
+    to out_path as it completes. Jobs already written successfully are
+    skipped, so rerunning after a crash or partial failure resumes the batch.
+    Failed jobs are written with an "error" field and retried on the next run.
+    """
+    out_path = Path(out_path)
+    done = _done_ids(out_path)
+    jobs = [job for job in _expand(specs) if job["id"] not in done]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(job: dict) -> dict:
+        async def attempt() -> str:
+            return await agenerate_post(job["length"], job["language"], job["tag"], tenant=job["tenant"])
+
+        async with semaphore:
+            try:
+                post = await with_retries(attempt, max_retries)
+            except Exception as e:
+                return {**job, "error": str(e)}
+        return {**job, "post": post}
+
+    started = time.perf_counter()
+    ok = failed = 0
+    with open(out_path, "a", encoding="utf-8") as out:
+        for fut in asyncio.as_completed([run(job) for job in jobs]):
+            record = await fut
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            if "post" in record:
+                ok += 1
+            else:
+                failed += 1
+    return {
+        "skipped": len(done),
+        "generated": ok,
+        "failed": failed,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+def generate_posts(specs: list[dict], out_path: str | Path,
+                   concurrency: int = 8, max_retries: int = 3) -> dict:
+    return asyncio.run(agenerate_posts(specs, out_path, concurrency, max_retries))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate LinkedIn posts in bulk")
+    parser.add_argument("specs", help="JSONL or CSV with length, language, tag, count")
+    parser.add_argument("-o", "--out", default="generated_posts.jsonl", help="output JSONL (appended/resumed)")
+    parser.add_argument("--concurrency", type=int, default=8, help="max in-flight LLM calls")
+    parser.add_argument("--retries", type=int, default=3, help="retries per post on 429/5xx")
+    parser.add_argument("--tenant", default=None, help="tenant for specs without one")
+    args = parser.parse_args()
+    try:
+        specs = load_specs(args.specs, args.tenant)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    summary = generate_posts(specs, args.out, args.concurrency, args.retries)
+    print(summary)
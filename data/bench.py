@@ -0,0 +1,373 @@
+# Copyright 2025 Shreya Kamalapurkar
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# data/bench.py
+# Offline benchmarks of the hot paths against the fake LLM backend:
+#   python data/bench.py --update-baseline      # once per machine: record bench_baseline.json
+#   python data/bench.py                        # then: fail on regressions against it
+# Startup stages (import time, first paint of main.py) run in fresh interpreters.
+# Only timings live here; tests/ checks that optimised paths return exactly what
+# the implementations they replaced did.
+# Exits non-zero when a stage is slower than its baseline by more than --tolerance.
+from __future__ import annotations
+
+import os
+os.environ["LLM_BACKEND"] = "fake"  # never hit the real API from here
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import orjson
+import pandas as pd
+
+import few_shot
+import near_dup
+import post_generator
+import preprocess
+from corpus_io import load_processed
+from fake_llm import FakeChatModel, fake_metadata
+
+DATA_DIR = Path(__file__).parent
+BASELINE_PATH = DATA_DIR / "bench_baseline.json"
+LENGTHS = ("Short", "Medium", "Long")
+
+def make_corpus(n: int, out_dir: Path, seed: int = 0) -> tuple[Path, Path]:
+    """Write synthetic raw and processed corpora of n posts built from raw_posts.json."""
+    rng = random.Random(seed)
+    sample = [p["text"] for p in orjson.loads(few_shot.RAW.read_bytes())]
+    raw, processed = [], []
+    for i in range(n):
+        lines = rng.choice(sample).splitlines()
+        rng.shuffle(lines)
+        text = "\n".join(lines[: rng.randint(1, len(lines))]) + f"\n#{i}"
+        post = {"text": text, "engagement": rng.randint(0, 20000)}
+        meta = fake_metadata(text)
+        lc = meta["line_count"]
+        raw.append(post)
+        processed.append(post | meta | {"length": "Short" if lc < 5 else "Medium" if lc <= 15 else "Long"})
+    raw_path, processed_path = out_dir / f"raw_{n}.json", out_dir / f"processed_{n}.json"
+    raw_path.write_bytes(orjson.dumps(raw))
+    processed_path.write_bytes(orjson.dumps(processed))
+    return raw_path, processed_path
+
+def _timed(fn, repeat: int) -> dict:
+    def sample():
+        start = time.perf_counter()
+        fn()
+        return (time.perf_counter() - start) * 1000
+    return _timed_values(sample, repeat)
+
+def _timed_values(measure, repeat: int) -> dict:
+    """Summarise repeat calls of measure(), which returns milliseconds."""
+    samples = sorted(measure() for _ in range(repeat))
+    return {
+        "median_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "runs": repeat,
+    }
+
+def run(sizes: list[int], process_max: int, repeat: int) -> dict:
+    results = {}
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        for n in sizes:
+            raw_path, path = make_corpus(n, tmp)
+            results[f"corpus_load_json@{n}"] = _timed(lambda: load_processed(path), 1)
+            results[f"fewshot_load@{n}"] = _timed(lambda: few_shot.FewShotPosts(path), max(1, repeat // 10))
+
+            fs = few_shot.get_few_shot(path)
+            tags = sorted(fs.get_tags() or [])
+
+            def filtered():
+                fs.get_filtered_posts(rng.choice(LENGTHS), None, rng.choice(tags))
+
+            def prompt():
+                post_generator.get_prompt(rng.choice(LENGTHS), "English", rng.choice(tags), path)
+
+            def generate():
+                post_generator.generate_post(rng.choice(LENGTHS), "English", rng.choice(tags),
+                                             use_cache=False, corpus_path=path)
+
+            results[f"get_filtered_posts@{n}"] = _timed(filtered, repeat)
+            prompt()  # first call builds the retrieval index
+            results[f"get_prompt@{n}"] = _timed(prompt, repeat)
+            results[f"generate_post@{n}"] = _timed(generate, repeat)
+
+            if n <= process_max:
+                def process():
+                    ckpt = tmp / f"ckpt_{n}_{time.perf_counter_ns()}.jsonl"
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        preprocess.process_post(raw_path, tmp / f"out_{n}.json", concurrency=8,
+                                                llm=FakeChatModel(), checkpoint_path=ckpt,
+                                                tag_mapping_path=tmp / f"tags_{n}.json")
+                results[f"process_post@{n}"] = _timed(process, 1)
+    return results
+
+class CountingLLM:
+    """Counts requests and prompt characters on their way to the fake model."""
+    def __init__(self, llm):
+        self.llm, self.requests, self.prompt_chars = llm, 0, 0
+
+    async def ainvoke(self, prompt: str, **kwargs):
+        self.requests += 1
+        self.prompt_chars += len(prompt)
+        return await self.llm.ainvoke(prompt, **kwargs)
+
+def run_packed(n: int, pack_tokens: int) -> dict:
+    """Single-post vs packed extraction on n posts (results: tests/test_packed.py)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        raw_path, _ = make_corpus(n, Path(tmp))
+        posts = [p["text"] for p in orjson.loads(raw_path.read_bytes())]
+    results = {}
+    for name, extract, kwargs in (
+        ("single", preprocess.extract_metadata_concurrent, {}),
+        ("packed", preprocess.extract_metadata_packed, {"pack_tokens": pack_tokens}),
+    ):
+        llm = CountingLLM(FakeChatModel())
+        start = time.perf_counter()
+        asyncio.run(extract(posts, llm, **kwargs))
+        results[f"extract_{name}@{n}"] = {
+            "median_ms": round((time.perf_counter() - start) * 1000, 3),
+            "runs": 1,
+            "requests": llm.requests,
+            "prompt_tokens": llm.prompt_chars // 4,
+        }
+    return results
+
+def reference_filter(df: pd.DataFrame, length=None, language=None, *tags, match="any") -> pd.DataFrame:
+    """FewShotPosts.get_filtered_posts before postings: full .apply scans per call."""
+    if length is not None:
+        df = df[df["length"] == length]
+    if language is not None:
+        df = df[df["language"] == language]
+    if tags:
+        s = df["tags"].apply(lambda x: x if isinstance(x, list) else [])
+        df = df[s.apply(lambda lst: all(t in lst for t in tags) if match == "all" else any(t in lst for t in tags))]
+    return df
+
+def filter_corpus(n: int, out_dir: Path, seed: int = 0) -> Path:
+    """Processed corpus with short texts: filters only read length, language and tags."""
+    rng = random.Random(seed)
+    topics = [*few_shot.TOPIC_RULES, few_shot.DEFAULT_TOPIC]
+    posts = []
+    for i in range(n):
+        lc = rng.choice((1, 3, 6, 9, 12, 18))
+        posts.append({
+            "text": f"post {i}",
+            "engagement": rng.randint(0, 20000),
+            "line_count": lc,
+            "length": "Short" if lc < 5 else "Medium" if lc <= 15 else "Long",
+            "language": "Hinglish" if rng.random() < 0.2 else "English",
+            "tags": rng.sample(topics, rng.randint(0, 2)),
+        })
+    path = out_dir / f"filter_{n}.json"
+    path.write_bytes(orjson.dumps(posts))
+    return path
+
+def run_filters(sizes: list[int], repeat: int) -> dict:
+    """Postings lookups vs the old scans on the same queries (results: tests/test_filters.py)."""
+    results = {}
+    rng = random.Random(3)
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            path = filter_corpus(n, Path(tmp))
+            fs = few_shot.FewShotPosts(path)
+            tags = sorted(fs.get_tags() or [])
+            queries = [(rng.choice((*LENGTHS, None)), rng.choice(("English", "Hinglish", None)),
+                        *rng.sample(tags, rng.randint(0, min(2, len(tags)))), rng.choice(("any", "all")))
+                       for _ in range(repeat)]
+            cycle = iter(queries * 2)
+            old = _timed(lambda: reference_filter(fs.df, *(q := next(cycle))[:-1], match=q[-1]),
+                         max(1, repeat // 10))
+            cycle = iter(queries * 2)
+            new = _timed(lambda: fs.get_filtered_posts(*(q := next(cycle))[:-1], match=q[-1]), repeat)
+            cycle = iter(queries * 2)
+            ids = _timed(lambda: fs.get_filtered_ids(*(q := next(cycle))[:-1], match=q[-1]), repeat)
+            speedup = lambda cur: round(old["median_ms"] / max(cur["median_ms"], 1e-9), 1)
+            results[f"filter_reference@{n}"] = old
+            # get_filtered_posts builds the frame; get_prompt only needs the ids
+            results[f"filter_postings@{n}"] = new | {"speedup": speedup(new)}
+            results[f"filter_ids@{n}"] = ids | {"speedup": speedup(ids)}
+    return results
+
+def reference_topic(text: str) -> str:
+    """few_shot._infer_topic before the rules were compiled: one re.search per rule."""
+    t = text.lower()
+    for topic, pat in few_shot.TOPIC_RULES.items():
+        if re.search(pat, t):
+            return topic
+    return few_shot.DEFAULT_TOPIC
+
+_TOPIC_WORDS = [w for pat in few_shot.TOPIC_RULES.values() for w in re.findall(r"[a-z]{3,}", pat)]
+
+def topic_texts(n: int, seed: int = 0) -> list[str]:
+    """Posts with rule keywords in random case, inflections, Unicode spaces and some non-ASCII text."""
+    rng = random.Random(seed)
+    lines = [line for p in orjson.loads(few_shot.RAW.read_bytes()) for line in p["text"].splitlines() if line.strip()]
+    extras = ["", "s", "ing", "é", "_x", "-", "2"]
+    # pasted text brings NBSPs, em spaces, NELs and CRLFs along
+    spaces = [" "] * 20 + ["\xa0", "\u2003", "\x85", "\r\n", "\t", "\x1c", ""]
+    texts = []
+    for _ in range(n):
+        words = " ".join(rng.sample(lines, rng.randint(1, 4))).split()
+        for _ in range(rng.randint(0, 3)):
+            word = rng.choice(_TOPIC_WORDS) + rng.choice(extras)
+            words.insert(rng.randint(0, len(words)), word.upper() if rng.random() < 0.2 else word)
+        if rng.random() < 0.05:
+            words.append("नमस्ते")
+        texts.append("".join(w + rng.choice(spaces) for w in words))
+    return texts
+
+def run_topics(sizes: list[int]) -> dict:
+    """Column-wide topic inference vs the per-row loop (labels: tests/test_topics.py)."""
+    results = {}
+    for n in sizes:
+        texts = pd.Series(topic_texts(n))
+        start = time.perf_counter()
+        for text in texts:
+            reference_topic(text)
+        old_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        few_shot._infer_topics(texts)
+        new_ms = (time.perf_counter() - start) * 1000
+        results[f"infer_topics_reference@{n}"] = {"median_ms": round(old_ms, 3), "runs": 1}
+        results[f"infer_topics@{n}"] = {"median_ms": round(new_ms, 3), "runs": 1,
+                                        "speedup": round(old_ms / max(new_ms, 1e-9), 1)}
+    return results
+
+def near_dup_texts(n: int, dup_rate: float = 0.05, seed: int = 0) -> list[str]:
+    """n synthetic posts of which about dup_rate are lightly edited reposts."""
+    rng = random.Random(seed)
+    lines = [line for p in orjson.loads(few_shot.RAW.read_bytes()) for line in p["text"].splitlines() if line.strip()]
+    texts = []
+    for i in range(n):
+        if texts and rng.random() < dup_rate:
+            words = rng.choice(texts).split(" ")
+            words[rng.randrange(len(words))] = "edited"
+            texts.append(" ".join(words))
+        else:
+            texts.append("\n".join(rng.sample(lines, rng.randint(3, 12))) + f" #{i}")
+    return texts
+
+def run_near_dup(sizes: list[int], repeat: int) -> dict:
+    results = {}
+    rng = random.Random(2)
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            texts = near_dup_texts(n)
+            path = Path(tmp) / f"near_dup_{n}.minhash"
+            results[f"near_dup_dedupe@{n}"] = _timed(lambda: near_dup.dedupe(texts), 1)
+            results[f"near_dup_build@{n}"] = _timed(lambda: near_dup.MinHashIndex.build(texts).save(path), 1)
+            # incremental: 1% new posts on top of the saved index
+            grown = texts + near_dup_texts(max(1, n // 100), seed=1)
+            results[f"near_dup_append@{n}"] = _timed(
+                lambda: near_dup.MinHashIndex.load_or_build(path, grown), 1)
+            index = near_dup.MinHashIndex.load(path)
+            results[f"near_dup_query@{n}"] = _timed(lambda: index.query(rng.choice(grown)), repeat)
+    return results
+
+_FIRST_PAINT = """
+import sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[1], default_timeout=120)
+at.run()
+assert not at.exception, at.exception
+print((time.perf_counter() - start) * 1000)
+"""
+
+def _fresh_python(code: str, *args: str) -> float:
+    out = subprocess.run([sys.executable, "-c", code, *args], cwd=DATA_DIR, check=True,
+                         capture_output=True, text=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+def startup(repeat: int) -> dict:
+    """Cold-start costs, each measured in a fresh interpreter."""
+    few_shot.get_few_shot()  # make sure the corpus and its manifest exist
+    results = {}
+    for module in ("manifest", "few_shot", "post_generator", "streamlit"):
+        code = f"import time; t = time.perf_counter(); import {module}; print((time.perf_counter() - t) * 1000)"
+        results[f"import_{module}"] = _timed_values(lambda: _fresh_python(code), repeat)
+    results["first_paint"] = _timed_values(lambda: _fresh_python(_FIRST_PAINT, str(DATA_DIR / "main.py")), repeat)
+    return results
+
+def compare(results: dict, baseline: dict, tolerance: float, floor_ms: float = 1.0) -> list[str]:
+    regressions = []
+    for name, cur in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if cur["median_ms"] > base["median_ms"] * tolerance and cur["median_ms"] - base["median_ms"] > floor_ms:
+            regressions.append(f"{name}: {base['median_ms']:.3f} ms -> {cur['median_ms']:.3f} ms")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the post generator hot paths offline")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--process-max", type=int, default=10000,
+                        help="largest corpus size to run process_post on")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--near-dup-sizes", type=int, nargs="*", default=[10000],
+                        help="corpus sizes for the MinHash dedupe/index stages (e.g. 1000000)")
+    parser.add_argument("--filter-sizes", type=int, nargs="*", default=[10000, 100000, 1000000],
+                        help="corpus sizes for postings vs the old get_filtered_posts scans")
+    parser.add_argument("--topic-sizes", type=int, nargs="*", default=[150000],
+                        help="texts for topic inference vs the old per-rule loop")
+    parser.add_argument("--packed-size", type=int, default=2000,
+                        help="posts for single vs packed extraction (0 to skip)")
+    parser.add_argument("--pack-tokens", type=int, default=preprocess.PACK_TOKENS)
+    parser.add_argument("--startup-repeat", type=int, default=5,
+                        help="fresh interpreters per import-time / first-paint stage (0 to skip)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=1.5,
+                        help="fail if median exceeds baseline by this factor")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("-o", "--out", type=Path, default=None, help="also write results here")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.process_max, args.repeat)
+    if args.near_dup_sizes:
+        results |= run_near_dup(args.near_dup_sizes, args.repeat)
+    if args.filter_sizes:
+        results |= run_filters(args.filter_sizes, args.repeat)
+    if args.topic_sizes:
+        results |= run_topics(args.topic_sizes)
+    if args.packed_size:
+        results |= run_packed(args.packed_size, args.pack_tokens)
+    if args.startup_repeat:
+        results |= startup(args.startup_repeat)
+    print(json.dumps(results, indent=2))
+    if args.out:
+        args.out.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"baseline written to {args.baseline}")
+        sys.exit(0)
+    if not args.baseline.exists():
+        # baselines are machine-specific, so none is committed; record one first
+        sys.exit(f"No baseline at {args.baseline}; run with --update-baseline on this machine first.")
+    regressions = compare(results, json.loads(args.baseline.read_text(encoding="utf-8")), args.tolerance)
+    if regressions:
+        print("Regressions:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+    print("No regressions against baseline.")
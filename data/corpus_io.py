@@ -0,0 +1,221 @@
+# Copyright 2025 Shreya Kamalapurkar
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# data/corpus_io.py
+# Corpus file formats:
+#   *.json   - the original JSON array of posts
+#   *.jsonl  - one post per line, parsed lazily with orjson
+#   *.cols/  - columnar cache of a processed file (memory-mapped .npy arrays)
+from __future__ import annotations
+
+import argparse
+import shutil
+import zlib
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+import numpy as np
+import orjson
+import pandas as pd
+
+try:  # zero-copy string column over the memory-mapped heap
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+COLUMNAR_VERSION = 1
+# columns the columnar cache knows how to store
+_STR_COLUMNS = ("length", "language", "title")
+
+def iter_posts(path: str | Path) -> Iterator[dict]:
+    """Yield posts from a .jsonl (streamed line by line) or .json array file."""
+    path = Path(path)
+    if path.suffix == ".jsonl":
+        with open(path, "rb") as f:
+            for line in f:
+                if line.strip():
+                    yield orjson.loads(line)
+    else:
+        yield from orjson.loads(path.read_bytes())
+
+def read_posts(path: str | Path) -> list[dict]:
+    return list(iter_posts(path))
+
+def write_jsonl(posts, path: str | Path) -> None:
+    tmp = Path(path).with_suffix(".jsonl.tmp")
+    with open(tmp, "wb") as f:
+        for post in posts:
+            f.write(orjson.dumps(post, option=orjson.OPT_SERIALIZE_NUMPY) + b"\n")
+    tmp.replace(path)
+
+def convert_to_jsonl(src: str | Path, dst: str | Path | None = None) -> Path:
+    """Rewrite a JSON array file as JSONL next to it (raw_posts.json -> raw_posts.jsonl)."""
+    src = Path(src)
+    dst = Path(dst) if dst else src.with_suffix(".jsonl")
+    write_jsonl(iter_posts(src), dst)
+    return dst
+
+def columnar_path(path: str | Path) -> Path:
+    return Path(path).with_suffix(".cols")
+
+def _source_sig(path: Path) -> list[int]:
+    st = path.stat()
+    return [st.st_mtime_ns, st.st_size]
+
+def _str_codes(values: pd.Series) -> tuple[np.ndarray, list[str]]:
+    codes, vocab = pd.factorize(values, use_na_sentinel=True)
+    return codes.astype(np.int32), [str(v) for v in vocab]
+
+def save_columnar(df: pd.DataFrame, source: str | Path) -> Path | None:
+    """
+    Write df as a columnar cache for source. Text is stored as one UTF-8 heap
+    plus byte offsets, categorical columns as int codes, tags as
+    offsets + codes. Returns None if df has columns the format can't hold.
+    """
+    known = {"text", "engagement", "line_count", "tags", *_STR_COLUMNS}
+    if not set(df.columns) <= known or "text" not in df.columns:
+        return None
+    source = Path(source)
+    out = columnar_path(source)
+    tmp = out.with_suffix(".cols.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    texts = [t.encode("utf-8") for t in df["text"].fillna("").astype(str)]
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum([len(t) for t in texts], out=offsets[1:])
+    heap = b"".join(texts)
+    np.save(tmp / "text_heap.npy", np.frombuffer(heap, dtype=np.uint8))
+    np.save(tmp / "text_offsets.npy", offsets)
+
+    meta = {"version": COLUMNAR_VERSION, "source": _source_sig(source), "rows": len(df), "vocab": {}}
+    if "engagement" in df.columns:
+        np.save(tmp / "engagement.npy", pd.to_numeric(df["engagement"], errors="coerce").to_numpy(np.float64))
+    if "line_count" in df.columns:
+        np.save(tmp / "line_count.npy", pd.to_numeric(df["line_count"], errors="coerce").fillna(1).to_numpy(np.int64))
+    for col in _STR_COLUMNS:
+        if col in df.columns:
+            codes, vocab = _str_codes(df[col])
+            np.save(tmp / f"{col}.npy", codes)
+            meta["vocab"][col] = vocab
+    if "tags" in df.columns:
+        lists = [x if isinstance(x, list) else [] for x in df["tags"]]
+        flat = [str(t) for lst in lists for t in lst]
+        codes, vocab = _str_codes(pd.Series(flat, dtype=object))
+        tag_offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+        np.cumsum([len(lst) for lst in lists], out=tag_offsets[1:])
+        np.save(tmp / "tags.npy", codes)
+        np.save(tmp / "tags_offsets.npy", tag_offsets)
+        meta["vocab"]["tags"] = vocab
+
+    (tmp / "meta.json").write_bytes(orjson.dumps(meta))
+    shutil.rmtree(out, ignore_errors=True)
+    tmp.replace(out)
+    return out
+
+def load_columnar(source: str | Path) -> pd.DataFrame | None:
+    """
+    Load the columnar cache for source if it exists and was built from the
+    current version of source; arrays are memory-mapped, not read up front.
+    """
+    source = Path(source)
+    cols = columnar_path(source)
+    try:
+        meta = orjson.loads((cols / "meta.json").read_bytes())
+    except (FileNotFoundError, orjson.JSONDecodeError):
+        return None
+    if meta.get("version") != COLUMNAR_VERSION or meta.get("source") != _source_sig(source):
+        return None
+
+    load = lambda name: np.load(cols / f"{name}.npy", mmap_mode="r")
+    offsets, heap = load("text_offsets"), load("text_heap")
+    if pa is not None:
+        arr = pa.LargeStringArray.from_buffers(len(offsets) - 1, pa.py_buffer(offsets), pa.py_buffer(heap))
+        text = pd.Series(pd.arrays.ArrowStringArray(arr))
+    else:
+        raw = bytes(heap)
+        text = [raw[a:b].decode("utf-8") for a, b in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+    data = {"text": text}
+    if (cols / "engagement.npy").exists():
+        data["engagement"] = np.asarray(load("engagement"))
+    if (cols / "line_count.npy").exists():
+        data["line_count"] = np.asarray(load("line_count"))
+    for col, vocab in meta["vocab"].items():
+        if col == "tags":
+            continue
+        data[col] = pd.Categorical.from_codes(np.asarray(load(col)), categories=vocab).astype(object)
+    if "tags" in meta["vocab"]:
+        vocab = np.asarray(meta["vocab"]["tags"], dtype=object)
+        names = vocab[np.asarray(load("tags"))].tolist() if len(vocab) else []
+        tag_offsets = load("tags_offsets").tolist()
+        data["tags"] = [names[a:b] for a, b in zip(tag_offsets[:-1], tag_offsets[1:])]
+    return pd.DataFrame(data)
+
+def load_processed(path: str | Path) -> pd.DataFrame:
+    """
+    Load a processed corpus, preferring its columnar cache. The cache is
+    (re)written from the JSON/JSONL file whenever it is missing or stale.
+    """
+    path = Path(path)
+    df = load_columnar(path)
+    if df is not None:
+        return df
+    df = pd.DataFrame(read_posts(path))
+    try:
+        save_columnar(df, path)
+    except OSError:
+        pass  # best-effort cache
+    return df
+
+# ---- Persisted per-corpus indexes (retrieval, near-duplicate) ----
+# Each index keeps text_crc, one crc32 per indexed post, and can append():
+# a saved index that covers a prefix of the corpus is extended, not rebuilt.
+
+def text_crc(texts: Iterable[str]) -> np.ndarray:
+    return np.fromiter((zlib.crc32((t or "").encode("utf-8")) for t in texts), dtype=np.uint32)
+
+def load_or_extend(path: str | Path, texts: list[str], load: Callable, build: Callable,
+                   append: Callable):
+    """
+    load(path) -> the saved index or None. If its text_crc covers a prefix
+    of texts, append(index, n) adds texts[n:]; if it doesn't match at all,
+    build() starts over. The result is written back when it changed.
+    """
+    index = load(path)
+    if index is not None:
+        n = len(index.text_crc)
+        if n > len(texts) or not np.array_equal(index.text_crc, text_crc(texts[:n])):
+            index = None
+        elif n == len(texts):
+            return index
+        else:
+            append(index, n)
+    if index is None:
+        index = build()
+    try:
+        index.save(path)
+    except OSError:
+        pass  # read-only deployments still get the in-memory index
+    return index
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert corpus files between formats")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("jsonl", help="rewrite a JSON array file as JSONL")
+    p.add_argument("src")
+    p.add_argument("dst", nargs="?")
+    p = sub.add_parser("columnar", help="build the columnar cache for a processed file")
+    p.add_argument("src")
+    args = parser.parse_args()
+    if args.cmd == "jsonl":
+        print(convert_to_jsonl(args.src, args.dst))
+    else:
+        print(save_columnar(pd.DataFrame(read_posts(args.src)), args.src))
@@ -0,0 +1,181 @@
+# Copyright 2025 Shreya Kamalapurkar
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# data/fake_llm.py
+# Deterministic offline stand-in for ChatGroq, selected with LLM_BACKEND=fake.
+#   FAKE_LLM_LATENCY     fixed:0.2 | uniform:0.1,0.5 | lognormal:-1.5,0.5 (seconds)
+#   FAKE_LLM_TPS         streamed tokens per second (0 = no delay)
+#   FAKE_LLM_ERROR_RATE  probability of raising an injected error
+#   FAKE_LLM_ERROR_STATUS  status code of injected errors (default 429)
+#   FAKE_LLM_EXTRA_LINES   lines written past the requested length (models overshoot)
+# max_tokens is honoured by truncating the answer (~4 characters per token).
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from typing import Any, Iterator
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+_TAG_KEYWORDS = {
+    "Productivity": ("work", "habit", "read", "consisten", "disciplin"),
+    "Leadership": ("leader", "team", "founder", "delegat"),
+    "Mindset": ("mindset", "belief", "dream", "respect", "confiden"),
+    "Business": ("business", "startup", "market", "company"),
+    "Finance": ("money", "rich", "wealth", "paise"),
+    "Motivation": ("success", "failure", "ambition"),
+}
+_HINGLISH = re.compile(r"\b(hai|hain|kya|nahi|par|ki|ka|aur|paise)\b")
+_POST_LINES = {"Short": 4, "Medium": 8, "Long": 14}
+
+class FakeAPIError(Exception):
+    """Injected provider error; status_code makes it look like a Groq error."""
+    def __init__(self, status_code: int):
+        super().__init__(f"fake LLM error {status_code}")
+        self.status_code = status_code
+
+def _seed(text: str) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+
+def fake_metadata(post: str) -> dict:
+    """Canned extract_metadata answer, derived only from the post text."""
+    low = post.lower()
+    tags = [tag for tag, words in _TAG_KEYWORDS.items() if any(w in low for w in words)][:2]
+    return {
+        "line_count": max(1, post.count("\n") + 1),
+        "language": "Hinglish" if _HINGLISH.search(low) else "English",
+        "tags": tags or ["Personal Growth"],
+    }
+
+_PACKED_POST = re.compile(r'<post id="(\d+)">\n(.*?)\n</post>', re.S)
+
+def _respond(prompt: str, extra_lines: int = 0) -> str:
+    if "For each post you need to extract number of lines, language and tags" in prompt:
+        # packed extraction: the same answers as one prompt per post, keyed by id
+        return json.dumps([{"id": int(i), **fake_metadata(post.strip())}
+                           for i, post in _PACKED_POST.findall(prompt)])
+    if "extract number of lines, language of the post and tags" in prompt:
+        post = prompt.split("Here is the actual post on which you need to perform this task:", 1)[-1]
+        return json.dumps(fake_metadata(post.strip()))
+    if "Here is the list of tags to unify:" in prompt:
+        canonical = re.search(r"allowed \(Title Case\) categories:\s*(.+)", prompt).group(1)
+        canonical = [c.strip() for c in canonical.split(",") if c.strip()]
+        tags = prompt.rsplit("Here is the list of tags to unify:", 1)[-1].strip()
+        mapping = {}
+        for tag in (t.strip() for t in tags.split(",") if t.strip()):
+            match = next((c for c in canonical if c.lower() in tag.lower() or tag.lower() in c.lower()), None)
+            mapping[tag] = match or canonical[_seed(tag) % len(canonical)]
+        return json.dumps(mapping)
+    # post generation: a deterministic post of the requested length
+    length = re.search(r"Length: (\w+)", prompt)
+    topic = re.search(r"Topic: (.+)", prompt)
+    n = _POST_LINES.get(length.group(1) if length else "", 6) + extra_lines
+    rng = random.Random(_seed(prompt))
+    words = ["focus", "build", "learn", "ship", "team", "habit", "grow", "listen", "today", "small"]
+    lines = [f"{(topic.group(1) if topic else 'Life').strip()} is a long game."]
+    lines += [" ".join(rng.choice(words) for _ in range(rng.randint(5, 10))).capitalize() + "."
+              for _ in range(n - 1)]
+    return "\n\n".join(lines)
+
+def _parse_latency(spec: str):
+    kind, _, args = (spec or "fixed:0").partition(":")
+    vals = [float(v) for v in args.split(",") if v]
+    if kind == "uniform":
+        return lambda: random.uniform(vals[0], vals[1])
+    if kind == "lognormal":
+        return lambda: random.lognormvariate(vals[0], vals[1])
+    return lambda: vals[0] if vals else 0.0
+
+class FakeChatModel(BaseChatModel):
+    """Offline chat model with configurable latency, token rate and errors."""
+    model_name: str = "fake-llm"
+    temperature: float = 0.0
+    latency: str = "fixed:0"
+    tokens_per_second: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 429
+    extra_lines: int = 0
+
+    @classmethod
+    def from_env(cls) -> FakeChatModel:
+        return cls(
+            latency=os.getenv("FAKE_LLM_LATENCY", "fixed:0"),
+            tokens_per_second=float(os.getenv("FAKE_LLM_TPS", "0")),
+            error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", "0")),
+            error_status=int(os.getenv("FAKE_LLM_ERROR_STATUS", "429")),
+            extra_lines=int(os.getenv("FAKE_LLM_EXTRA_LINES", "0")),
+        )
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _prompt(self, messages: list[BaseMessage]) -> str:
+        return "\n".join(str(m.content) for m in messages)
+
+    def _maybe_fail(self) -> None:
+        if self.error_rate and random.random() < self.error_rate:
+            raise FakeAPIError(self.error_status)
+
+    @staticmethod
+    def _usage(prompt: str, text: str) -> dict:
+        # ~4 characters per token, like the rate-limit estimates elsewhere
+        p, c = len(prompt) // 4, len(text) // 4
+        return {"input_tokens": p, "output_tokens": c, "total_tokens": p + c}
+
+    def _text(self, prompt: str, max_tokens: int | None) -> str:
+        text = _respond(prompt, self.extra_lines)
+        return text[: max_tokens * 4] if max_tokens else text
+
+    @staticmethod
+    def _finish(text: str, max_tokens: int | None) -> dict:
+        truncated = bool(max_tokens) and len(text) >= max_tokens * 4
+        return {"finish_reason": "length" if truncated else "stop"}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        prompt = self._prompt(messages)
+        time.sleep(_parse_latency(self.latency)())
+        self._maybe_fail()
+        text = self._text(prompt, kwargs.get("max_tokens"))
+        if self.tokens_per_second:
+            time.sleep(len(text) / 4 / self.tokens_per_second)
+        msg = AIMessage(content=text, usage_metadata=self._usage(prompt, text),
+                        response_metadata=self._finish(text, kwargs.get("max_tokens")))
+        return ChatResult(generations=[ChatGeneration(message=msg)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        prompt = self._prompt(messages)
+        await asyncio.sleep(_parse_latency(self.latency)())
+        self._maybe_fail()
+        text = self._text(prompt, kwargs.get("max_tokens"))
+        if self.tokens_per_second:
+            await asyncio.sleep(len(text) / 4 / self.tokens_per_second)
+        msg = AIMessage(content=text, usage_metadata=self._usage(prompt, text),
+                        response_metadata=self._finish(text, kwargs.get("max_tokens")))
+        return ChatResult(generations=[ChatGeneration(message=msg)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        prompt = self._prompt(messages)
+        time.sleep(_parse_latency(self.latency)())
+        self._maybe_fail()
+        text = self._text(prompt, kwargs.get("max_tokens"))
+        delay = 1 / self.tokens_per_second if self.tokens_per_second else 0
+        for token in re.findall(r"\s*\S+|\s+", text):
+            if delay:
+                time.sleep(delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
@@ -11,13 +11,29 @@
 
 # data/few_shot.py
 from pathlib import Path
-import json
+import hashlib
+import os
 import re
+import threading
+from itertools import chain, count
+import numpy as np
 import pandas as pd
 
+import metrics
+from corpus_io import iter_posts, load_processed, save_columnar
+from manifest import load_manifest, write_manifest
+from near_dup import THRESHOLD as NEAR_DUP_THRESHOLD, MinHashIndex
+from retrieval import PostIndex
+from tenants import corpus_path
+
 DATA_DIR = Path(__file__).parent
 PROCESSED = DATA_DIR / "processed_posts.json"
 RAW = DATA_DIR / "raw_posts.json"
+RAW_JSONL = DATA_DIR / "raw_posts.jsonl"
+# estimated memory the shared registry may hold before evicting cold corpora
+CACHE_BYTES = int(float(os.getenv("CORPUS_CACHE_MB", "1024")) * 2**20)
+# rankings memoised per snapshot by get_examples before the memo is reset
+RANKED_CACHE_SIZE = 4096
 
 TOPIC_RULES = {
     "Productivity":  r"\b(work|outwork|grind|disciplin|consisten|habit|read)\w*",
@@ -31,44 +47,142 @@ TOPIC_RULES = {
 }
 DEFAULT_TOPIC = "General"
 
+# Word-anchored rule shape, e.g. r"\b(team|leader)\b" or r"\b(work|habit)\w*"
+_RULE_SHAPE = re.compile(r"\\b\((?P<alts>.+)\)(?:\\b|\\w\*)")
+
+def _split_alternatives(alts: str) -> list[str]:
+    parts, depth, cur = [], 0, ""
+    for ch in alts:
+        if ch == "|" and depth == 0:
+            parts.append(cur)
+            cur = ""
+            continue
+        depth += (ch == "(") - (ch == ")")
+        cur += ch
+    return parts + [cur]
+
+def _required_literals(pat: str) -> tuple[str, ...] | None:
+    """
+    Literal prefixes of a word-anchored rule: any match must contain one of
+    them, so a plain substring test can rule the pattern out cheaply.
+    None when the rule isn't a simple alternation we can reason about.
+    """
+    m = _RULE_SHAPE.fullmatch(pat)
+    if m is None:
+        return None
+    literals = []
+    for alt in _split_alternatives(m.group("alts")):
+        lit = re.match(r"[a-z0-9]*", alt).group(0)
+        if lit and len(lit) < len(alt) and alt[len(lit)] in "?*{":
+            lit = lit[:-1]  # last char is optional
+        if not lit:
+            return None
+        literals.append(lit)
+    return tuple(literals)
+
+# TOPIC_RULES compiled once, in priority order
+_COMPILED_RULES = [
+    (topic, re.compile(pat), _required_literals(pat))
+    for topic, pat in TOPIC_RULES.items()
+]
+
 def _infer_topic(text: str) -> str:
     t = text.lower()
-    for topic, pat in TOPIC_RULES.items():
-        if re.search(pat, t):
+    for topic, regex, literals in _COMPILED_RULES:
+        if literals is not None and not any(lit in t for lit in literals):
+            continue
+        if regex.search(t):
             return topic
     return DEFAULT_TOPIC
 
+# (RE2 syntax) any non-ASCII character that isn't punctuation, symbol, space or control
+_NON_ASCII_WORD = r"[^\x00-\x7f\p{P}\p{S}\p{Z}\p{C}]"
+# Python's str \s spelled out; RE2's \s only covers [\t\n\f\r ]
+_UNICODE_SPACE = "[\t-\r\x1c-\x20\x85\xa0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000]"
+# TOPIC_RULES with non-capturing groups and explicit whitespace, for column-wide str.contains
+_COLUMN_RULES = [
+    (topic, re.sub(r"\((?!\?)", "(?:", pat).replace(r"\s", _UNICODE_SPACE))
+    for topic, pat in TOPIC_RULES.items()
+]
+
+def _infer_topics(texts: pd.Series) -> pd.Series:
+    """
+    _infer_topic over a whole text column: one column-wide regex pass per
+    rule, in priority order, over the rows no earlier rule claimed. With
+    pyarrow-backed strings the passes run in RE2, whose \\b and \\w are
+    ASCII-only, so rows with non-ASCII letters, digits or marks go through
+    _infer_topic instead (curly quotes, dashes, emoji and Unicode spaces
+    are fine).
+    """
+    texts = texts.fillna("").astype(str)
+    topics = np.full(len(texts), DEFAULT_TOPIC, dtype=object)
+    if getattr(texts.dtype, "storage", None) == "pyarrow":
+        unicode_words = texts.str.contains(_NON_ASCII_WORD, regex=True).to_numpy(dtype=bool)
+    else:
+        unicode_words = np.zeros(len(texts), dtype=bool)  # Python re: same engine as _infer_topic
+    rows = np.flatnonzero(~unicode_words)
+    lowered = texts.iloc[rows].str.lower()
+    for topic, pat in _COLUMN_RULES:
+        if not len(rows):
+            break
+        hit = lowered.str.contains(pat, regex=True).to_numpy(dtype=bool)
+        topics[rows[hit]] = topic
+        rows, lowered = rows[~hit], lowered[~hit]
+    other = np.flatnonzero(unicode_words)
+    if len(other):
+        topics[other] = texts.iloc[other].map(_infer_topic).to_numpy(dtype=object)
+    return pd.Series(topics, index=texts.index, dtype=texts.dtype)
+
 def _count_lines(text: str) -> int:
     return max(1, text.count("\n") + 1)
 
+def _length_labels(line_counts: pd.Series) -> pd.Series:
+    return pd.Series(
+        np.select([line_counts < 5, line_counts <= 15], ["Short", "Medium"], "Long"),
+        index=line_counts.index,
+    )
+
 class FewShotPosts:
-    def __init__(self, file_path: str | Path = PROCESSED):
+    def __init__(self, file_path: str | Path = PROCESSED, raw_path: str | Path | None = None):
         self.df: pd.DataFrame | None = None
         self.unique_tags: set[str] | None = None
+        # (field, value) -> sorted row positions, built once in load_posts
+        self._postings: dict[tuple[str, str], np.ndarray] = {}
+        self.file_path = Path(file_path)
+        # raw posts to build from when file_path doesn't exist yet
+        self.raw_path = Path(raw_path) if raw_path else self.file_path.with_name(RAW.name)
+        self._df_bytes = 0
+        self._index: PostIndex | None = None
+        self._dup_index: MinHashIndex | None = None
+        self._index_lock = threading.Lock()
+        self._ranked: dict[tuple, np.ndarray] = {}
         self.load_posts(file_path)
 
     def _build_from_raw(self) -> pd.DataFrame:
-        if not RAW.exists():
+        raw_jsonl = self.raw_path.with_suffix(".jsonl")
+        raw_path = raw_jsonl if raw_jsonl.exists() else self.raw_path
+        if not raw_path.exists():
             return pd.DataFrame(columns=["text","engagement","line_count","length","language","tags","title"])
-        raw = json.loads(RAW.read_text(encoding="utf-8"))
-        rows = []
-        for item in raw:
-            text = (item.get("text") or "").strip()
-            lc = _count_lines(text)
-            topic = _infer_topic(text)
-            rows.append({
-                "text": text,
-                "engagement": item.get("engagement"),
-                "line_count": lc,
-                "length": ("Short" if lc < 5 else "Medium" if lc <= 15 else "Long"),
-                "language": "English",
-                "tags": [topic],
-                "title": topic,
-            })
-        df = pd.DataFrame(rows)
+        texts, engagement = [], []
+        for item in iter_posts(raw_path):
+            texts.append((item.get("text") or "").strip())
+            engagement.append(item.get("engagement"))
+        texts = pd.Series(texts, dtype=object)
+        topics = _infer_topics(texts)
+        line_counts = texts.str.count("\n").add(1).clip(lower=1).astype(int)
+        df = pd.DataFrame({
+            "text": texts,
+            "engagement": engagement,
+            "line_count": line_counts,
+            "length": _length_labels(line_counts),
+            "language": "English",
+            "tags": topics.map(lambda t: [t]),
+            "title": topics,
+        })
         # best-effort cache
         try:
-            PROCESSED.write_text(df.to_json(orient="records", force_ascii=False, indent=2), encoding="utf-8")
+            self.file_path.write_text(df.to_json(orient="records", force_ascii=False, indent=2), encoding="utf-8")
+            save_columnar(df, self.file_path)
         except Exception:
             pass
         return df
@@ -76,39 +190,262 @@ class FewShotPosts:
     def load_posts(self, file_path: str | Path):
         file_path = Path(file_path)
         if file_path.exists():
-            posts = json.loads(file_path.read_text(encoding="utf-8"))
-            df = pd.json_normalize(posts)
+            df = load_processed(file_path)
         else:
             df = self._build_from_raw()
 
         if "line_count" not in df.columns:
-            df["line_count"] = df["text"].fillna("").apply(_count_lines)
+            df["line_count"] = df["text"].fillna("").astype(str).str.count("\n").add(1).clip(lower=1)
         if "length" not in df.columns:
-            df["length"] = df["line_count"].apply(lambda n: "Short" if n < 5 else "Medium" if n <= 15 else "Long")
+            df["length"] = _length_labels(df["line_count"])
         if "language" not in df.columns:
             df["language"] = "English"
         if "tags" not in df.columns:
             if "title" in df.columns:
                 df["tags"] = df["title"].apply(lambda v: [v] if pd.notna(v) else [])
             else:
-                df["tags"] = df["text"].fillna("").apply(lambda t: [_infer_topic(t)] if t else [])
+                texts = df["text"].fillna("").astype(str)
+                df["tags"] = [[topic] if t else [] for t, topic in zip(texts, _infer_topics(texts))]
 
+        df = df.reset_index(drop=True)
+        tags = df["tags"].apply(lambda x: x if isinstance(x, list) else [])
         self.df = df
-        all_tags = df["tags"].apply(lambda x: x if isinstance(x, list) else []).sum()
-        self.unique_tags = set(all_tags)
+        self.unique_tags = set(chain.from_iterable(tags))
+        self._postings = self._build_postings(df, tags)
+        self._df_bytes = int(df.memory_usage(deep=True).sum())
+        # keep the UI's manifest in step with whatever corpus was loaded
+        if file_path.exists() and load_manifest(file_path) is None:
+            write_manifest(file_path, self.unique_tags, df["length"].dropna(), df["language"].dropna())
+
+    @staticmethod
+    def _build_postings(df: pd.DataFrame, tags: pd.Series) -> dict[tuple[str, str], np.ndarray]:
+        postings = {}
+        for field in ("length", "language"):
+            for value, rows in df.groupby(field, sort=False).indices.items():
+                postings[(field, value)] = np.asarray(rows, dtype=np.int64)
+        exploded = tags.explode().dropna()
+        rows = exploded.index.to_numpy(dtype=np.int64)
+        for tag, pos in exploded.groupby(exploded, sort=False).indices.items():
+            postings[("tag", tag)] = np.unique(rows[pos])
+        return postings
+
+    def memory_bytes(self) -> int:
+        """Estimated resident size: frame, postings and whichever indexes are loaded."""
+        size = self._df_bytes + sum(rows.nbytes for rows in self._postings.values())
+        for index in (self._index, self._dup_index):
+            if index is not None:
+                size += index.nbytes
+        return size
 
     def get_tags(self) -> set[str] | None:
         return self.unique_tags
 
-    def get_filtered_posts(self, length=None, language=None, *tags, match="any") -> pd.DataFrame:
+    def get_filtered_ids(self, length=None, language=None, *tags, match="any") -> np.ndarray:
+        """Row positions matching the filters, in corpus order."""
         if self.df is None:
-            return pd.DataFrame()
-        df = self.df
+            return np.empty(0, dtype=np.int64)
+        empty = np.empty(0, dtype=np.int64)
+        ids = None
         if length is not None:
-            df = df[df["length"] == length]
+            ids = self._postings.get(("length", length), empty)
         if language is not None:
-            df = df[df["language"] == language]
+            rows = self._postings.get(("language", language), empty)
+            ids = rows if ids is None else np.intersect1d(ids, rows, assume_unique=True)
         if tags:
-            s = df["tags"].apply(lambda x: x if isinstance(x, list) else [])
-            df = df[s.apply(lambda lst: all(t in lst for t in tags) if match=="all" else any(t in lst for t in tags))]
-        return df
+            lists = [self._postings.get(("tag", t), empty) for t in tags]
+            if match == "all" or len(lists) == 1:
+                rows = lists[0]  # postings are already sorted and unique
+                for other in lists[1:]:
+                    rows = np.intersect1d(rows, other, assume_unique=True)
+            else:
+                rows = np.unique(np.concatenate(lists))
+            ids = rows if ids is None else np.intersect1d(ids, rows, assume_unique=True)
+        if ids is None:
+            return np.arange(len(self.df), dtype=np.int64)
+        return ids
+
+    def get_first_match(self, *queries: tuple) -> np.ndarray:
+        """
+        Resolve a fallback chain: each query is a get_filtered_ids argument
+        tuple, and the ids of the first non-empty one are returned.
+        """
+        with metrics.span("corpus.filter"):
+            for query in queries:
+                ids = self.get_filtered_ids(*query)
+                if len(ids):
+                    return ids
+            return np.empty(0, dtype=np.int64)
+
+    def get_filtered_posts(self, length=None, language=None, *tags, match="any") -> pd.DataFrame:
+        if self.df is None:
+            return pd.DataFrame()
+        return self.df.iloc[self.get_filtered_ids(length, language, *tags, match=match)]
+
+    def get_index(self) -> PostIndex:
+        """Retrieval index for this corpus, persisted next to the processed file."""
+        built = False
+        if self._index is None:
+            with self._index_lock:
+                if self._index is None:
+                    engagement = self.df["engagement"] if "engagement" in self.df.columns else None
+                    self._index = PostIndex.load_or_build(
+                        self.file_path.with_suffix(".index.npz"),
+                        self.df["text"].fillna("").astype(str).tolist(),
+                        engagement,
+                    )
+                    built = True
+        if built:
+            _enforce_budget(self.file_path)
+        return self._index
+
+    def get_dup_index(self) -> MinHashIndex:
+        """Near-duplicate (MinHash/LSH) index for this corpus, persisted next to it."""
+        built = False
+        if self._dup_index is None:
+            with self._index_lock:
+                if self._dup_index is None:
+                    self._dup_index = MinHashIndex.load_or_build(
+                        self.file_path.with_suffix(".minhash"),
+                        self.df["text"].fillna("").astype(str).tolist(),
+                    )
+                    built = True
+        if built:
+            _enforce_budget(self.file_path)
+        return self._dup_index
+
+    def find_near_duplicates(self, text: str,
+                             threshold: float = NEAR_DUP_THRESHOLD) -> tuple[np.ndarray, np.ndarray]:
+        """(row_ids, similarities) of corpus posts that text nearly copies."""
+        if self.df is None or not len(self.df):
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        index = self.get_dup_index()
+        with metrics.span("corpus.near_dup"):
+            return index.query(text, threshold)
+
+    def get_examples(self, query: str, *queries: tuple, k: int = 1) -> pd.DataFrame:
+        """
+        get_top_examples over the first non-empty filter of queries (see
+        get_first_match). A snapshot never changes, so rankings are memoised
+        per (query, queries, k): get_prompt keeps asking the same few
+        tag/length pairs, and a common tag word has long postings.
+        """
+        if self.df is None or not len(self.df):
+            return pd.DataFrame()
+        key = (query, queries, k)
+        rows = self._ranked.get(key)
+        if rows is None:
+            ids = self.get_first_match(*queries)
+            if len(ids):
+                with metrics.span("corpus.rank"):
+                    rows, _ = self.get_index().query(query, k=k, candidates=ids)
+            else:
+                rows = ids
+            if len(self._ranked) >= RANKED_CACHE_SIZE:
+                self._ranked.clear()  # free-text queries could grow it without bound
+            self._ranked[key] = rows
+        return self.df.iloc[rows]
+
+    def get_top_examples(self, query: str, k: int = 1, ids: np.ndarray | None = None) -> pd.DataFrame:
+        """
+        Top-k posts for a topic or free-text brief, ranked by similarity and
+        engagement; ids restricts the search to those rows (e.g. a filter).
+        """
+        if self.df is None or not len(self.df):
+            return pd.DataFrame()
+        index = self.get_index()
+        with metrics.span("corpus.rank"):
+            rows, _ = index.query(query, k=k, candidates=ids)
+            return self.df.iloc[rows]
+
+# ---- Shared corpus registry ----
+# One FewShotPosts snapshot per corpus file (one per tenant shard), shared by
+# get_prompt, main.py and batch callers. A snapshot is never mutated after it is
+# built; reloads build a fresh instance and swap the reference, so readers
+# always see a complete one. Snapshots are evicted least-recently-used once
+# their estimated memory exceeds CACHE_BYTES and reloaded on the next request.
+# Hashing and parsing a corpus happen under that corpus's own build lock;
+# _REGISTRY_LOCK is only held to swap entries and evict, so one cold tenant
+# never stalls the others.
+_REGISTRY: dict[Path, tuple[tuple | None, str | None, FewShotPosts]] = {}
+_REGISTRY_LOCK = threading.Lock()
+_BUILD_LOCKS: dict[Path, threading.Lock] = {}
+_LAST_USED: dict[Path, int] = {}  # written without the lock on every hit
+_CLOCK = count()
+
+def _file_stat(path: Path) -> tuple | None:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def _file_hash(path: Path) -> str | None:
+    try:
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+def _evict(keep: Path) -> None:
+    """Drop least recently used snapshots until the rest fit CACHE_BYTES (lock held)."""
+    sizes = {path: entry[2].memory_bytes() for path, entry in _REGISTRY.items()}
+    total = sum(sizes.values())
+    for path in sorted(sizes, key=lambda p: _LAST_USED.get(p, -1)):
+        if total <= CACHE_BYTES:
+            break
+        if path == keep:
+            continue
+        del _REGISTRY[path]
+        _LAST_USED.pop(path, None)
+        total -= sizes[path]
+        metrics.incr("corpus_evictions")
+
+def _enforce_budget(path: Path) -> None:
+    """Re-check the budget once a registered snapshot has grown (index loaded)."""
+    with _REGISTRY_LOCK:
+        if path in _REGISTRY:
+            _evict(keep=path)
+
+def registry_stats() -> dict:
+    with _REGISTRY_LOCK:
+        entries = list(_REGISTRY.values())
+    return {
+        "corpora": len(entries),
+        "bytes": sum(entry[2].memory_bytes() for entry in entries),
+        "budget_bytes": CACHE_BYTES,
+    }
+
+def get_few_shot(file_path: str | Path = PROCESSED, tenant: str | None = None) -> FewShotPosts:
+    """
+    Return the shared FewShotPosts for file_path (or for tenant's shard),
+    reloading it only when the file's mtime/size changed *and* its content
+    hash differs.
+    """
+    path = (corpus_path(tenant) if tenant else Path(file_path)).resolve()
+    entry = _REGISTRY.get(path)
+    stat = _file_stat(path)
+    if entry is not None and entry[0] == stat:
+        _LAST_USED[path] = next(_CLOCK)
+        return entry[2]
+
+    with _REGISTRY_LOCK:
+        build_lock = _BUILD_LOCKS.setdefault(path, threading.Lock())
+    with build_lock:
+        _LAST_USED[path] = next(_CLOCK)
+        entry = _REGISTRY.get(path)
+        stat = _file_stat(path)
+        if entry is not None and entry[0] == stat:
+            return entry[2]
+        digest = _file_hash(path)
+        if entry is not None and entry[1] == digest:
+            # touched but unchanged: keep the snapshot, remember the new stat
+            with _REGISTRY_LOCK:
+                _REGISTRY[path] = (stat, digest, entry[2])
+            return entry[2]
+        with metrics.span("corpus.load"):
+            fs = FewShotPosts(path)
+        # building from raw may have just written the processed cache
+        stat, digest = _file_stat(path), _file_hash(path)
+        with _REGISTRY_LOCK:
+            _REGISTRY[path] = (stat, digest, fs)
+            _evict(keep=path)
+        return fs
@@ -12,7 +12,14 @@
 # data/llm_helper.py
 from __future__ import annotations
 
+import asyncio
+import concurrent.futures
+import hashlib
 import os
+import queue
+import random
+import threading
+import time
 from typing import Optional
 
 from dotenv import load_dotenv
@@ -34,11 +41,16 @@ def _key_from_env() -> Optional[str]:
 def get_api_key() -> Optional[str]:
     return _key_from_streamlit() or _key_from_env()
 
-def get_llm() -> ChatGroq:
+def get_llm(timeout: Optional[float] = None) -> ChatGroq:
     """
     Lazily create the Groq LLM. This avoids crashes during module import
     on Streamlit Cloud when the key isn't set yet.
+    Set LLM_BACKEND=fake to get the offline FakeChatModel instead.
     """
+    load_dotenv()  # LLM_BACKEND may live in .env too
+    if os.getenv("LLM_BACKEND", "").lower() == "fake":
+        from fake_llm import FakeChatModel
+        return FakeChatModel.from_env()
     api_key = get_api_key()
     if not api_key:
         raise RuntimeError(
@@ -49,8 +61,322 @@ def get_llm() -> ChatGroq:
     return ChatGroq(
         groq_api_key=api_key,
         model_name="llama-3.3-70b-versatile",
+        timeout=timeout,
     )
 
+class RateLimiter:
+    """
+    Async token buckets for a provider's requests-per-minute and
+    tokens-per-minute quotas. A limit of None disables that bucket.
+    """
+    def __init__(self, rpm: Optional[int] = None, tpm: Optional[int] = None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm or 0)
+        self._tokens = float(tpm or 0)
+        self._stamp = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed, self._stamp = now - self._stamp, now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    async def acquire(self, tokens: int = 0) -> None:
+        if not self.rpm and not self.tpm:
+            return
+        # a single request larger than the whole bucket would wait forever
+        tokens = min(tokens, self.tpm) if self.tpm else 0
+        async with self._lock:
+            while True:
+                self._refill()
+                wait = 0.0
+                if self.rpm and self._requests < 1:
+                    wait = max(wait, (1 - self._requests) * 60 / self.rpm)
+                if self.tpm and self._tokens < tokens:
+                    wait = max(wait, (tokens - self._tokens) * 60 / self.tpm)
+                if wait <= 0:
+                    if self.rpm:
+                        self._requests -= 1
+                    if self.tpm:
+                        self._tokens -= tokens
+                    return
+                await asyncio.sleep(wait)
+
+def is_retryable(exc: BaseException) -> bool:
+    """True for rate-limit (429) and server-side (5xx) errors."""
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status == 429 or (isinstance(status, int) and status >= 500)
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """Full-jitter exponential backoff for the given (0-based) attempt."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+async def with_retries(fn, max_retries: int):
+    """
+    Return await fn(), calling it again after backoff_delay on retryable
+    (429/5xx) errors, at most max_retries times; other errors raise at once.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return await fn()
+        except Exception as e:
+            if attempt == max_retries or not is_retryable(e):
+                raise
+            await asyncio.sleep(backoff_delay(attempt))
+
+class LLMPool:
+    """
+    Shared, thread-safe access to the chat model.
+
+    - the model is created lazily, once, on first use;
+    - at most max_in_flight upstream calls run at a time, the rest queue;
+    - every call has a timeout that covers both the wait for a slot and the
+      upstream call; a call that overruns it raises TimeoutError while the
+      request finishes in the background, still holding its slot;
+    - with coalesce=True, identical in-flight requests (same prompt and
+      kwargs) share one upstream call instead of paying for the same
+      completion twice. It is off by default: callers that want distinct
+      samples of one prompt (batch counts, cache variants) must not share.
+
+    invoke/ainvoke/stream mirror the LangChain chat model methods, and other
+    attributes (model_name, temperature, ...) are read from the model.
+    """
+    def __init__(self, factory=None, max_in_flight: int = 8, timeout: float = 60.0):
+        self._factory = factory or (lambda: get_llm(timeout=timeout))
+        self.timeout = timeout
+        self._llm = None
+        self._init_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        # runs sync calls under their deadline; each task holds a slot, so
+        # max_in_flight workers never make a call wait for a thread
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_in_flight, thread_name_prefix="llm")
+        self._lock = threading.Lock()
+        self._inflight: dict[str, concurrent.futures.Future] = {}
+        self.metrics = {
+            "calls": 0, "coalesced": 0, "timeouts": 0, "errors": 0,
+            "in_flight": 0, "waiting": 0, "max_waiting": 0, "wait_seconds": 0.0,
+        }
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            with self._init_lock:
+                if self._llm is None:
+                    self._llm = self._factory()
+        return self._llm
+
+    def __getattr__(self, name):
+        # only reached for attributes LLMPool itself doesn't define
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.llm, name)
+
+    @staticmethod
+    def _key(prompt, kwargs: dict) -> str:
+        return hashlib.sha256(repr((prompt, sorted(kwargs.items()))).encode("utf-8")).hexdigest()
+
+    def _count(self, name: str, delta=1) -> None:
+        with self._lock:
+            self.metrics[name] += delta
+
+    def _acquire(self, timeout: float) -> None:
+        if self._slots.acquire(blocking=False):
+            self._count("in_flight")
+            return
+        with self._lock:
+            self.metrics["waiting"] += 1
+            self.metrics["max_waiting"] = max(self.metrics["max_waiting"], self.metrics["waiting"])
+        started = time.monotonic()
+        ok = self._slots.acquire(timeout=timeout)
+        with self._lock:
+            self.metrics["waiting"] -= 1
+            self.metrics["wait_seconds"] += time.monotonic() - started
+            if ok:
+                self.metrics["in_flight"] += 1
+            else:
+                self.metrics["timeouts"] += 1
+        if not ok:
+            raise TimeoutError(f"no LLM slot free within {timeout:g}s")
+
+    def _release(self) -> None:
+        self._count("in_flight", -1)
+        self._slots.release()
+
+    async def _aacquire(self, timeout: float) -> None:
+        if self._slots.acquire(blocking=False):
+            self._count("in_flight")
+            return
+        waiter = asyncio.ensure_future(asyncio.to_thread(self._acquire, timeout))
+        try:
+            await asyncio.shield(waiter)
+        except asyncio.CancelledError:
+            # the thread keeps waiting; hand the slot back if it gets one
+            def release_if_acquired(task: asyncio.Future) -> None:
+                if not task.cancelled() and task.exception() is None:
+                    self._release()
+            waiter.add_done_callback(release_if_acquired)
+            raise
+
+    def _submit(self, fn, *args, **kwargs) -> concurrent.futures.Future:
+        """Run fn on the executor; the slot (already held) is freed when it returns."""
+        try:
+            fut = self._executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._release()
+            raise
+        fut.add_done_callback(lambda _: self._release())
+        return fut
+
+    def _timed_out(self, timeout: float) -> TimeoutError:
+        self._count("timeouts")
+        return TimeoutError(f"LLM call took longer than {timeout:g}s")
+
+    def _call(self, prompt, timeout: float, kwargs: dict):
+        deadline = time.monotonic() + timeout
+        self._acquire(timeout)
+        fut = self._submit(self.llm.invoke, prompt, **kwargs)
+        try:
+            return fut.result(timeout=max(0.0, deadline - time.monotonic()))
+        except concurrent.futures.TimeoutError:
+            raise self._timed_out(timeout) from None
+
+    async def _acall(self, prompt, timeout: float, kwargs: dict):
+        deadline = time.monotonic() + timeout
+        await self._aacquire(timeout)
+        try:
+            return await asyncio.wait_for(self.llm.ainvoke(prompt, **kwargs),
+                                          max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            raise self._timed_out(timeout) from None
+        finally:
+            self._release()
+
+    def _join(self, key: str) -> tuple[concurrent.futures.Future, bool]:
+        """Return (future, is_leader) for key."""
+        with self._lock:
+            fut = self._inflight.get(key)
+            if fut is not None:
+                self.metrics["coalesced"] += 1
+                return fut, False
+            fut = concurrent.futures.Future()
+            self._inflight[key] = fut
+            self.metrics["calls"] += 1
+            return fut, True
+
+    def _finish(self, key: str, fut: concurrent.futures.Future, result=None, error=None) -> None:
+        with self._lock:
+            self._inflight.pop(key, None)
+            if error is not None:
+                self.metrics["errors"] += 1
+        if error is not None:
+            fut.set_exception(error)
+        else:
+            fut.set_result(result)
+
+    def invoke(self, prompt, timeout: Optional[float] = None, coalesce: bool = False, **kwargs):
+        timeout = timeout or self.timeout
+        if not coalesce:
+            self._count("calls")
+            try:
+                return self._call(prompt, timeout, kwargs)
+            except Exception:
+                self._count("errors")
+                raise
+        key = self._key(prompt, kwargs)
+        fut, leader = self._join(key)
+        if not leader:
+            return fut.result(timeout=timeout)
+        try:
+            result = self._call(prompt, timeout, kwargs)
+        except BaseException as e:
+            self._finish(key, fut, error=e)
+            raise
+        self._finish(key, fut, result=result)
+        return result
+
+    async def ainvoke(self, prompt, timeout: Optional[float] = None, coalesce: bool = False, **kwargs):
+        timeout = timeout or self.timeout
+        if not coalesce:
+            self._count("calls")
+            try:
+                return await self._acall(prompt, timeout, kwargs)
+            except Exception:
+                self._count("errors")
+                raise
+        key = self._key(prompt, kwargs)
+        fut, leader = self._join(key)
+        if not leader:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(fut)), timeout)
+        try:
+            result = await self._acall(prompt, timeout, kwargs)
+        except BaseException as e:
+            self._finish(key, fut, error=e)
+            raise
+        self._finish(key, fut, result=result)
+        return result
+
+    def stream(self, prompt, timeout: Optional[float] = None, **kwargs):
+        """
+        Stream chunks; holds a slot for the whole stream (never coalesced).
+        The timeout covers the whole stream, not each chunk.
+        """
+        timeout = timeout or self.timeout
+        deadline = time.monotonic() + timeout
+        self._acquire(timeout)
+        chunks: queue.Queue = queue.Queue()
+        stop = threading.Event()
+
+        def produce() -> None:
+            try:
+                for chunk in self.llm.stream(prompt, **kwargs):
+                    if stop.is_set():
+                        return
+                    chunks.put(("chunk", chunk))
+                chunks.put(("done", None))
+            except BaseException as e:
+                chunks.put(("error", e))
+
+        self._submit(produce)
+        try:
+            while True:
+                try:
+                    kind, item = chunks.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    raise self._timed_out(timeout) from None
+                if kind == "done":
+                    return
+                if kind == "error":
+                    raise item
+                yield item
+        finally:
+            stop.set()  # the producer drops the stream at its next chunk
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.metrics)
+
+def coalesce_kwargs(llm) -> dict:
+    """Extra invoke kwargs that let an LLMPool share identical in-flight calls."""
+    return {"coalesce": True} if isinstance(llm, LLMPool) else {}
+
+_POOL: Optional[LLMPool] = None
+_POOL_LOCK = threading.Lock()
+
+def get_pool() -> LLMPool:
+    """Process-wide LLMPool used by post_generator and preprocess."""
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = LLMPool()
+    return _POOL
+
 # Optional local quick test: `python data/llm_helper.py`
 if __name__ == "__main__":
     try:
@@ -0,0 +1,145 @@
+# Copyright 2025 Shreya Kamalapurkar
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# data/loadtest.py
+# Closed-loop load test of the HTTP service:
+#   python data/loadtest.py --spawn --workers 2 -n 500 -c 32
+# --spawn starts service.py against the fake LLM backend (FAKE_LLM_* settings
+# are passed through) and stops it afterwards; otherwise --url is used as is.
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+import httpx
+
+DATA_DIR = Path(__file__).parent
+LENGTHS = ("Short", "Medium", "Long")
+TAGS = ("Productivity", "Mindset", "Leadership", "Psychology", "General")
+
+def _percentile(sorted_vals: list[float], q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    return sorted_vals[min(len(sorted_vals) - 1, int(q * len(sorted_vals)))]
+
+def _spec(rng: random.Random, use_cache: bool) -> dict:
+    return {"length": rng.choice(LENGTHS), "language": "English", "tag": rng.choice(TAGS),
+            "use_cache": use_cache}
+
+async def run(url: str, requests: int, concurrency: int, endpoint: str = "generate",
+              batch_size: int = 5, use_cache: bool = False, seed: int = 0) -> dict:
+    """Fire requests with concurrency in flight; returns throughput and latency percentiles."""
+    rng = random.Random(seed)
+    latencies, first_bytes, statuses = [], [], Counter()
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    async def one(client: httpx.AsyncClient) -> None:
+        start = time.perf_counter()
+        if endpoint == "stream":
+            async with client.stream("POST", "/generate/stream", json=_spec(rng, use_cache)) as resp:
+                first = None
+                async for _ in resp.aiter_bytes():
+                    first = first or time.perf_counter() - start
+                if first is not None and resp.status_code == 200:
+                    first_bytes.append(first)
+                status = resp.status_code
+        elif endpoint == "batch":
+            body = {"items": [_spec(rng, use_cache) for _ in range(batch_size)]}
+            status = (await client.post("/generate/batch", json=body)).status_code
+        else:
+            status = (await client.post("/generate", json=_spec(rng, use_cache))).status_code
+        latencies.append(time.perf_counter() - start)
+        statuses[status] += 1
+
+    async def worker(client: httpx.AsyncClient) -> None:
+        while not queue.empty():
+            queue.get_nowait()
+            try:
+                await one(client)
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    first_bytes.sort()
+    ms = lambda v: round(v * 1000, 1)
+    result = {
+        "endpoint": endpoint,
+        "requests": requests,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 2),
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": ms(_percentile(latencies, 0.50)),
+        "p95_ms": ms(_percentile(latencies, 0.95)),
+        "p99_ms": ms(_percentile(latencies, 0.99)),
+        "status": {str(k): v for k, v in sorted(statuses.items(), key=str)},
+    }
+    if first_bytes:
+        result["first_byte_p50_ms"] = ms(_percentile(first_bytes, 0.50))
+    return result
+
+def spawn(port: int, workers: int) -> subprocess.Popen:
+    env = {**os.environ, "LLM_BACKEND": "fake"}
+    proc = subprocess.Popen(
+        [sys.executable, str(DATA_DIR / "service.py"), "--port", str(port), "--workers", str(workers)],
+        env=env,
+    )
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/readyz", timeout=1).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            pass
+        if proc.poll() is not None:
+            raise RuntimeError("service exited during startup")
+        time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("service did not become ready")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the post generator service")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("-n", "--requests", type=int, default=200)
+    parser.add_argument("-c", "--concurrency", type=int, default=16)
+    parser.add_argument("--endpoint", choices=("generate", "stream", "batch"), default="generate")
+    parser.add_argument("--batch-size", type=int, default=5)
+    parser.add_argument("--cache", action="store_true", help="allow cached completions")
+    parser.add_argument("--spawn", action="store_true", help="start service.py on the fake backend")
+    parser.add_argument("--workers", type=int, default=2, help="worker processes with --spawn")
+    parser.add_argument("--port", type=int, default=8765, help="port for --spawn")
+    args = parser.parse_args()
+
+    proc = spawn(args.port, args.workers) if args.spawn else None
+    url = f"http://127.0.0.1:{args.port}" if proc else args.url
+    try:
+        result = asyncio.run(run(url, args.requests, args.concurrency, args.endpoint,
+                                 args.batch_size, args.cache))
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait(timeout=30)
+    print(json.dumps(result, indent=2))
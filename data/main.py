@@ -9,29 +9,88 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import threading
+
 import streamlit as st
-from few_shot import FewShotPosts
-from post_generator import generate_post
+import metrics
+from manifest import load_manifest
+from tenants import corpus_path
+
+# few_shot (pandas) and post_generator (LangChain) are imported lazily: the
+# controls render from the precomputed manifest, and the heavy modules are
+# warmed in a background thread while the user fills in the form.
 
 st.set_page_config(page_title="LinkedIn Post Generator", page_icon="📝", layout="centered")
 
-# Cache FewShotPosts loader
+LENGTHS = ["Short", "Medium", "Long"]
+LANGUAGES = ["English", "Hinglish"]
+
+def _warm(tenant: str | None):
+    import post_generator  # pulls in the LangChain stack
+    post_generator.warm_prompts(tenant=tenant)
+
 @st.cache_resource
-def get_fs():
-    return FewShotPosts()
+def start_warmup(tenant: str | None = None) -> threading.Thread:
+    """Once per process and tenant: import and load everything Generate will need."""
+    thread = threading.Thread(target=_warm, args=(tenant,), name=f"warmup-{tenant or 'default'}", daemon=True)
+    thread.start()
+    return thread
+
+def get_tenant() -> str | None:
+    """Tenant from the ?tenant= query parameter (None = the default corpus)."""
+    tenant = st.query_params.get("tenant") or None
+    # like the service: ValueError for malformed ids and for tenants without a corpus
+    if tenant is not None and not corpus_path(tenant).exists():
+        raise ValueError(f"unknown tenant: {tenant}")
+    return tenant
 
-# Cache tags (no need to hash the fs object itself)
-@st.cache_data
-def get_available_tags():
-    fs = get_fs()
-    tags = fs.get_tags() or set()
-    return sorted(tags) if tags else ["Productivity", "Mindset"]
+# Shared FewShotPosts for the tenant (reloads itself when its corpus changes)
+def get_fs(tenant: str | None = None):
+    from few_shot import get_few_shot
+    return get_few_shot(tenant=tenant)
+
+def _options(found, defaults):
+    return list(defaults) + [v for v in found or [] if v not in defaults]
+
+def get_options(tenant: str | None = None):
+    """(tags, lengths, languages) for the form, from the manifest when it is current."""
+    manifest = load_manifest(corpus_path(tenant))
+    if manifest is not None:
+        tags = manifest["tags"]
+        lengths, languages = manifest["lengths"], manifest["languages"]
+    else:
+        tags, lengths, languages = sorted(get_fs(tenant).get_tags() or set()), [], []
+    return (tags or ["Productivity", "Mindset"],
+            _options(lengths, LENGTHS), _options(languages, LANGUAGES))
+
+def render_metrics():
+    """Sidebar p50/p95 per stage; only shown when METRICS_ENABLED=1."""
+    snap = metrics.snapshot()
+    with st.sidebar:
+        st.header("Latency")
+        rows = [
+            {"stage": stage, "p50 ms": s["p50"] * 1000, "p95 ms": s["p95"] * 1000, "count": s["count"]}
+            for stage, s in sorted(snap["stages"].items())
+        ]
+        if rows:
+            st.dataframe(rows, hide_index=True)
+        else:
+            st.caption("No samples yet.")
+        for name, value in sorted(snap["counters"].items()):
+            st.metric(name, f"{value:g}")
 
 def main():
     st.title("LinkedIn Post Generator")
 
+    try:
+        tenant = get_tenant()
+    except ValueError as e:
+        st.error(f"⚠️ {e}")
+        return
+
     with st.spinner("Loading dataset…"):
-        available_tags = get_available_tags()
+        available_tags, lengths, languages = get_options(tenant)
+    start_warmup(tenant)
 
     with st.form("controls"):
         col1, col2, col3 = st.columns(3)
@@ -40,21 +99,24 @@ def main():
             title = st.selectbox("Title", available_tags, index=0)
 
         with col2:
-            length = st.selectbox("Length", ["Short", "Medium", "Long"], index=1)
+            length = st.selectbox("Length", lengths, index=1)
 
         with col3:
-            language = st.selectbox("Language", ["English", "Hinglish"], index=0)
+            language = st.selectbox("Language", languages, index=0)
 
         submitted = st.form_submit_button("Generate")
 
     if submitted:
-        with st.spinner("Generating post…"):
-            try:
-                post = generate_post(length, language, title)
-                st.subheader("Generated Post")
-                st.write(post)
-            except Exception as e:
-                st.error(f"⚠️ Error while generating: {e}")
+        st.subheader("Generated Post")
+        try:
+            from post_generator import stream_post
+            # render tokens as they arrive instead of waiting for the full post
+            st.write_stream(stream_post(length, language, title, tenant=tenant))
+        except Exception as e:
+            st.error(f"⚠️ Error while generating: {e}")
+
+    if metrics.ENABLED:
+        render_metrics()
 
 if __name__ == "__main__":
     main()
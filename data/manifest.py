@@ -0,0 +1,80 @@
+# Copyright 2025 Shreya Kamalapurkar
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# data/manifest.py
+# Small JSON summary of a processed corpus (tags, lengths, languages) that
+# the UI can read without importing pandas or loading the corpus. Written
+# next to the corpus as processed_posts.manifest.json. Standard library only:
+# importing this module must stay cheap.
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Iterable
+
+MANIFEST_VERSION = 1
+LENGTHS = ("Short", "Medium", "Long")
+
+def manifest_path(processed: str | Path) -> Path:
+    return Path(processed).with_suffix(".manifest.json")
+
+def _source_sig(path: Path) -> list[int]:
+    st = path.stat()
+    return [st.st_mtime_ns, st.st_size]
+
+def _length_label(line_count) -> str:
+    # same bands as few_shot._length_labels
+    try:
+        n = int(line_count)
+    except (TypeError, ValueError):
+        n = 1
+    return "Short" if n < 5 else "Medium" if n <= 15 else "Long"
+
+def write_manifest(processed: str | Path, tags: Iterable[str], lengths: Iterable[str],
+                   languages: Iterable[str]) -> Path | None:
+    """Write the manifest for processed (best-effort; None if it can't be written)."""
+    processed = Path(processed)
+    order = {name: i for i, name in enumerate(LENGTHS)}
+    data = {
+        "version": MANIFEST_VERSION,
+        "source": _source_sig(processed),
+        "tags": sorted({str(t) for t in tags if t}),
+        "lengths": sorted({str(v) for v in lengths if v}, key=lambda v: (order.get(v, len(order)), v)),
+        "languages": sorted({str(v) for v in languages if v}),
+    }
+    out = manifest_path(processed)
+    tmp = out.with_suffix(".json.tmp")
+    try:
+        tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        tmp.replace(out)
+    except OSError:
+        return None
+    return out
+
+def write_manifest_from_posts(processed: str | Path, posts: Iterable[dict]) -> Path | None:
+    """Manifest for a list of processed post dicts (as written by preprocess)."""
+    tags, lengths, languages = set(), set(), set()
+    for post in posts:
+        tags.update(t for t in post.get("tags") or [] if isinstance(t, str))
+        lengths.add(post.get("length") or _length_label(post.get("line_count")))
+        languages.add(post.get("language") or "English")
+    return write_manifest(processed, tags, lengths, languages)
+
+def load_manifest(processed: str | Path) -> dict | None:
+    """The manifest for processed, or None if it is missing or out of date."""
+    processed = Path(processed)
+    try:
+        data = json.loads(manifest_path(processed).read_text(encoding="utf-8"))
+        if data.get("version") != MANIFEST_VERSION or data.get("source") != _source_sig(processed):
+            return None
+    except (OSError, ValueError):
+        return None
+    return data
@@ -0,0 +1,139 @@
+# Copyright 2025 Shreya Kamalapurkar
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# data/metrics.py
+# Lightweight per-stage timing and counters. Off unless METRICS_ENABLED=1
+# (or enable() is called); when off, span() returns a shared no-op context
+# manager and incr()/observe() return immediately.
+from __future__ import annotations
+
+import contextlib
+import json
+import os
+import threading
+import time
+from collections import deque
+
+ENABLED = os.getenv("METRICS_ENABLED", "").lower() in ("1", "true", "yes")
+WINDOW = 2048  # latency samples kept per stage for percentiles
+
+_NULL = contextlib.nullcontext()
+_lock = threading.Lock()
+_samples: dict[str, deque] = {}
+_totals: dict[str, list] = {}   # stage -> [count, sum_seconds]
+_counters: dict[str, float] = {}
+
+def enable(flag: bool = True) -> None:
+    global ENABLED
+    ENABLED = flag
+
+def reset() -> None:
+    with _lock:
+        _samples.clear()
+        _totals.clear()
+        _counters.clear()
+
+def observe(stage: str, seconds: float) -> None:
+    if not ENABLED:
+        return
+    with _lock:
+        window = _samples.get(stage)
+        if window is None:
+            window = _samples[stage] = deque(maxlen=WINDOW)
+            _totals[stage] = [0, 0.0]
+        window.append(seconds)
+        total = _totals[stage]
+        total[0] += 1
+        total[1] += seconds
+
+def incr(name: str, value: float = 1) -> None:
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+class _Span:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+def span(stage: str):
+    """Time the enclosed block as one sample of stage."""
+    return _Span(stage) if ENABLED else _NULL
+
+def record_usage(message) -> None:
+    """Count prompt/completion tokens from a LangChain AIMessage."""
+    if not ENABLED or message is None:
+        return
+    usage = getattr(message, "usage_metadata", None) or {}
+    prompt, completion = usage.get("input_tokens"), usage.get("output_tokens")
+    if prompt is None:
+        token_usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+        prompt, completion = token_usage.get("prompt_tokens"), token_usage.get("completion_tokens")
+    if prompt:
+        incr("llm_prompt_tokens", prompt)
+    if completion:
+        incr("llm_completion_tokens", completion)
+
+def record_estimated_usage(prompt: str, completion: str) -> None:
+    """Count tokens (~4 characters each) for calls that report no usage, e.g. cut-off streams."""
+    if not ENABLED:
+        return
+    incr("llm_prompt_tokens", len(prompt) // 4)
+    incr("llm_completion_tokens", len(completion) // 4)
+
+def _quantile(sorted_vals: list[float], q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    return sorted_vals[min(len(sorted_vals) - 1, int(q * len(sorted_vals)))]
+
+def snapshot() -> dict:
+    with _lock:
+        samples = {k: sorted(v) for k, v in _samples.items()}
+        totals = {k: list(v) for k, v in _totals.items()}
+        counters = dict(_counters)
+    stages = {
+        stage: {
+            "count": totals[stage][0],
+            "sum_seconds": totals[stage][1],
+            "p50": _quantile(vals, 0.50),
+            "p95": _quantile(vals, 0.95),
+        }
+        for stage, vals in samples.items()
+    }
+    return {"stages": stages, "counters": counters}
+
+def export_json() -> str:
+    return json.dumps(snapshot(), indent=2)
+
+def export_prometheus(prefix: str = "post_generator") -> str:
+    """Prometheus text exposition format."""
+    snap = snapshot()
+    out = [f"# TYPE {prefix}_stage_seconds summary"]
+    for stage, s in sorted(snap["stages"].items()):
+        label = f'stage="{stage}"'
+        out.append(f'{prefix}_stage_seconds{{{label},quantile="0.5"}} {s["p50"]:.6f}')
+        out.append(f'{prefix}_stage_seconds{{{label},quantile="0.95"}} {s["p95"]:.6f}')
+        out.append(f"{prefix}_stage_seconds_sum{{{label}}} {s['sum_seconds']:.6f}")
+        out.append(f"{prefix}_stage_seconds_count{{{label}}} {s['count']}")
+    for name, value in sorted(snap["counters"].items()):
+        out.append(f"# TYPE {prefix}_{name}_total counter")
+        out.append(f"{prefix}_{name}_total {value:g}")
+    return "\n".join(out) + "\n"
@@ -0,0 +1,298 @@
+# Copyright 2025 Shreya Kamalapurkar
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# data/near_dup.py
+# MinHash signatures over word 3-gram shingles, with LSH banding for
+# near-duplicate lookup. Used to drop reposted / lightly edited posts before
+# preprocessing and to catch generated posts that copy a corpus example.
+#   python data/near_dup.py raw_posts.json          # report duplicate clusters
+from __future__ import annotations
+
+import argparse
+import re
+import shutil
+import zlib
+from itertools import chain
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+import orjson
+import pandas as pd
+
+from corpus_io import load_or_extend, read_posts, text_crc
+
+NUM_PERM = 64
+BANDS = 16          # 16 bands x 4 rows: a pair at 0.8 Jaccard collides with p > 0.999
+THRESHOLD = 0.8     # estimated Jaccard similarity that counts as a near duplicate
+SEED = 1
+INDEX_VERSION = 1
+_CHUNK_SHINGLES = 1 << 17  # bounds the (NUM_PERM x shingles) work matrix
+_DOC_BATCH = 1 << 14
+_EMPTY = np.uint32(0xFFFFFFFF)
+_WORD = re.compile(r"\w+")
+
+def _params(seed: int = SEED) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 1 << 63, NUM_PERM, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 1 << 63, NUM_PERM, dtype=np.uint64)
+    band_coef = rng.integers(1, 1 << 63, NUM_PERM // BANDS, dtype=np.uint64) | np.uint64(1)
+    return a, b, band_coef
+
+_A, _B, _BAND_COEF = _params()
+_MIX = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 1], dtype=np.uint64)
+
+def _word_hashes(texts: Iterable[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Flat crc32 of every word plus words per text; each distinct word is hashed once."""
+    words = [_WORD.findall((t or "").lower()) for t in texts]
+    lengths = np.fromiter(map(len, words), dtype=np.int64, count=len(words))
+    flat = np.empty(int(lengths.sum()), dtype=object)
+    flat[:] = list(chain.from_iterable(words))
+    codes, vocab = pd.factorize(flat)
+    vocab_hash = np.fromiter((zlib.crc32(w.encode("utf-8")) for w in vocab), dtype=np.uint64, count=len(vocab))
+    return vocab_hash[codes], lengths
+
+def _shingles(flat: np.ndarray, lengths: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Flat uint64 shingle hashes plus per-document counts (word 3-grams; whole text if shorter)."""
+    ends = np.cumsum(lengths)
+    doc = np.repeat(np.arange(len(lengths)), lengths)
+    pos = np.arange(len(flat)) - (ends - lengths)[doc]
+    short = lengths[doc] < 3
+    tri = (pos + 2 < lengths[doc]) & ~short
+    idx = np.flatnonzero(tri)
+    shingles = np.empty(len(flat), dtype=np.uint64)
+    shingles[idx] = flat[idx] * _MIX[0] + flat[idx + 1] * _MIX[1] + flat[idx + 2]
+    # posts under three words: their words are the shingles
+    shingles[short] = flat[short]
+    keep = tri | short
+    counts = np.bincount(doc[keep], minlength=len(lengths))
+    return shingles[keep], counts
+
+def _signatures(texts: list[str]) -> np.ndarray:
+    shingles, counts = _shingles(*_word_hashes(texts))
+    n = len(counts)
+    sigs = np.full((n, NUM_PERM), _EMPTY, dtype=np.uint32)
+    starts = np.concatenate([[0], np.cumsum(counts)])
+    doc = 0
+    while doc < n:
+        # take documents until the chunk holds ~_CHUNK_SHINGLES shingles
+        stop = max(doc + 1, int(np.searchsorted(starts, starts[doc] + _CHUNK_SHINGLES, side="right")) - 1)
+        stop = min(stop, n)
+        lo, hi = starts[doc], starts[stop]
+        if hi > lo:
+            # permutation-major, so the per-document min runs over contiguous memory
+            hashed = ((_A[:, None] * shingles[None, lo:hi] + _B[:, None]) >> np.uint64(32)).astype(np.uint32)
+            nonempty = np.flatnonzero(counts[doc:stop])
+            sigs[doc + nonempty] = np.minimum.reduceat(hashed, starts[doc:stop][nonempty] - lo, axis=1).T
+        doc = stop
+    return sigs
+
+def signatures(texts: Iterable[str]) -> np.ndarray:
+    """(n, NUM_PERM) uint32 MinHash signatures; empty posts get all-0xFFFFFFFF."""
+    texts = list(texts)
+    if not texts:
+        return np.empty((0, NUM_PERM), dtype=np.uint32)
+    # batches keep the per-word Python objects bounded on large corpora
+    return np.concatenate([_signatures(texts[i:i + _DOC_BATCH]) for i in range(0, len(texts), _DOC_BATCH)])
+
+def band_keys(sigs: np.ndarray) -> np.ndarray:
+    """(n, BANDS) uint64 LSH keys: one hash per band of NUM_PERM // BANDS rows."""
+    rows = sigs.reshape(len(sigs), BANDS, NUM_PERM // BANDS).astype(np.uint64)
+    return (rows * _BAND_COEF).sum(axis=2, dtype=np.uint64)
+
+def similarity(sig: np.ndarray, sigs: np.ndarray) -> np.ndarray:
+    """Estimated Jaccard similarity of sig to each row of sigs."""
+    return (sigs == sig).mean(axis=1)
+
+def _components(n: int, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Connected-component label (smallest member id) for each of n nodes."""
+    labels = np.arange(n)
+    while True:
+        low = np.minimum(labels[a], labels[b])
+        new = labels.copy()
+        np.minimum.at(new, a, low)
+        np.minimum.at(new, b, low)
+        new = new[new]  # pointer jumping
+        if np.array_equal(new, labels):
+            return labels
+        labels = new
+
+def _candidate_pairs(keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Pairs of rows sharing a band key, each paired with the first row of its bucket."""
+    firsts, others = [], []
+    for band in range(keys.shape[1]):
+        order = np.argsort(keys[:, band], kind="stable")
+        sorted_keys = keys[order, band]
+        new_run = np.ones(len(order), dtype=bool)
+        new_run[1:] = sorted_keys[1:] != sorted_keys[:-1]
+        head = np.maximum.accumulate(np.where(new_run, np.arange(len(order)), 0))
+        dup = ~new_run
+        firsts.append(order[head[dup]])
+        others.append(order[dup])
+    if not firsts:
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    return np.concatenate(firsts), np.concatenate(others)
+
+def duplicate_groups(texts: list[str], threshold: float = THRESHOLD,
+                     sigs: np.ndarray | None = None) -> np.ndarray:
+    """Group label per text; texts with the same label are near duplicates."""
+    sigs = signatures(texts) if sigs is None else sigs
+    a, b = _candidate_pairs(band_keys(sigs))
+    if len(a):
+        pairs = np.unique(np.stack([np.minimum(a, b), np.maximum(a, b)], axis=1), axis=0)
+        a, b = pairs[:, 0], pairs[:, 1]
+        sims = np.concatenate([(sigs[a[i:i + 65536]] == sigs[b[i:i + 65536]]).mean(axis=1)
+                               for i in range(0, len(a), 65536)])
+        a, b = a[sims >= threshold], b[sims >= threshold]
+    return _components(len(sigs), a, b)
+
+def dedupe(texts: list[str], threshold: float = THRESHOLD, priority: Iterable | None = None,
+           sigs: np.ndarray | None = None) -> np.ndarray:
+    """
+    Sorted indices of the texts to keep: one per near-duplicate group, the
+    one with the highest priority (e.g. engagement), earliest on ties.
+    sigs may come from a persisted MinHashIndex to skip re-signing.
+    """
+    labels = duplicate_groups(texts, threshold, sigs)
+    prio = np.zeros(len(labels)) if priority is None else \
+        np.nan_to_num(np.asarray(list(priority), dtype=np.float64), nan=-np.inf)
+    order = np.lexsort((np.arange(len(labels)), -prio, labels))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = labels[order][1:] != labels[order][:-1]
+    return np.sort(order[first])
+
+class MinHashIndex:
+    """
+    Persistent LSH index over corpus posts. For each band the keys are kept
+    sorted (with their row ids), so a lookup is BANDS binary searches plus a
+    signature comparison against the few colliding rows.
+
+    Stored as a directory of .npy files that are memory-mapped on load.
+    """
+    def __init__(self):
+        self.sigs = np.empty((0, NUM_PERM), dtype=np.uint32)
+        self.text_crc = np.empty(0, dtype=np.uint32)
+        self.sorted_keys = np.empty((BANDS, 0), dtype=np.uint64)
+        self.sorted_ids = np.empty((BANDS, 0), dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.sigs)
+
+    @property
+    def nbytes(self) -> int:
+        """Heap bytes held; memory-mapped arrays are backed by the page cache instead."""
+        arrays = (self.sigs, self.text_crc, self.sorted_keys, self.sorted_ids)
+        return sum(a.nbytes for a in arrays if not isinstance(a, np.memmap))
+
+    @classmethod
+    def build(cls, texts: list[str]) -> MinHashIndex:
+        index = cls()
+        index.append(texts)
+        return index
+
+    def append(self, texts: list[str]) -> None:
+        texts = list(texts)
+        if not texts:
+            return
+        sigs = signatures(texts)
+        keys = band_keys(sigs).T
+        ids = np.arange(len(self), len(self) + len(texts), dtype=np.int32)
+        merged_keys = np.empty((BANDS, len(self) + len(texts)), dtype=np.uint64)
+        merged_ids = np.empty_like(merged_keys, dtype=np.int32)
+        for band in range(BANDS):
+            order = np.argsort(keys[band], kind="stable")
+            new_keys, new_ids = keys[band][order], ids[order]
+            pos = np.searchsorted(self.sorted_keys[band], new_keys, side="right")
+            merged_keys[band] = np.insert(self.sorted_keys[band], pos, new_keys)
+            merged_ids[band] = np.insert(self.sorted_ids[band], pos, new_ids)
+        self.sorted_keys, self.sorted_ids = merged_keys, merged_ids
+        self.sigs = np.concatenate([self.sigs, sigs])
+        self.text_crc = np.concatenate([self.text_crc, text_crc(texts)])
+
+    def query(self, text: str, threshold: float = THRESHOLD) -> tuple[np.ndarray, np.ndarray]:
+        """Rows whose estimated similarity to text is >= threshold, most similar first."""
+        if not len(self):
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        sig = signatures([text])[0]
+        keys = band_keys(sig[None, :])[0]
+        hits = []
+        for band in range(BANDS):
+            lo = np.searchsorted(self.sorted_keys[band], keys[band], side="left")
+            hi = np.searchsorted(self.sorted_keys[band], keys[band], side="right")
+            if hi > lo:
+                hits.append(self.sorted_ids[band][lo:hi])
+        if not hits:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        rows = np.unique(np.concatenate(hits)).astype(np.int64)
+        sims = similarity(sig, self.sigs[rows])
+        keep = sims >= threshold
+        rows, sims = rows[keep], sims[keep]
+        order = np.argsort(-sims, kind="stable")
+        return rows[order], sims[order]
+
+    def save(self, path: str | Path) -> None:
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        np.save(tmp / "sigs.npy", self.sigs)
+        np.save(tmp / "text_crc.npy", self.text_crc)
+        np.save(tmp / "sorted_keys.npy", self.sorted_keys)
+        np.save(tmp / "sorted_ids.npy", self.sorted_ids)
+        (tmp / "meta.json").write_bytes(orjson.dumps(
+            {"version": INDEX_VERSION, "num_perm": NUM_PERM, "bands": BANDS, "seed": SEED, "rows": len(self)}))
+        shutil.rmtree(path, ignore_errors=True)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: str | Path) -> MinHashIndex | None:
+        """The index saved at path, or None if missing or built with other parameters."""
+        path = Path(path)
+        try:
+            meta = orjson.loads((path / "meta.json").read_bytes())
+        except (FileNotFoundError, orjson.JSONDecodeError):
+            return None
+        if meta != {"version": INDEX_VERSION, "num_perm": NUM_PERM, "bands": BANDS, "seed": SEED,
+                    "rows": meta.get("rows")}:
+            return None
+        index = cls()
+        load = lambda name: np.load(path / f"{name}.npy", mmap_mode="r")
+        index.sigs, index.text_crc = load("sigs"), load("text_crc")
+        index.sorted_keys, index.sorted_ids = load("sorted_keys"), load("sorted_ids")
+        return index
+
+    @classmethod
+    def load_or_build(cls, path: str | Path, texts: list[str]) -> MinHashIndex:
+        """
+        Load the persisted index for these texts, appending any new posts if
+        it covers a prefix of them and rebuilding if it doesn't match.
+        Written back when changed.
+        """
+        texts = list(texts)
+        return load_or_extend(path, texts, cls.load, build=lambda: cls.build(texts),
+                              append=lambda index, n: index.append(texts[n:]))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report near-duplicate posts in a corpus file")
+    parser.add_argument("path")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args()
+    posts = read_posts(args.path)
+    texts = [p.get("text") or "" for p in posts]
+    labels = duplicate_groups(texts, args.threshold)
+    groups: dict[int, list[int]] = {}
+    for i, label in enumerate(labels.tolist()):
+        groups.setdefault(label, []).append(i)
+    dups = [g for g in groups.values() if len(g) > 1]
+    print(f"{len(texts)} posts, {len(dups)} near-duplicate groups, "
+          f"{sum(len(g) - 1 for g in dups)} removable")
+    for g in dups:
+        print("  " + ", ".join(map(str, g)) + ": " + texts[g[0]][:60].replace("\n", " "))
@@ -12,16 +12,55 @@
 # data/post_generator.py
 from __future__ import annotations
 
-from llm_helper import get_llm
-from few_shot import FewShotPosts
+import os
+import time
+from pathlib import Path
 
-# Cache a single LLM instance per process (faster; avoids re-auth each call)
-_LLM = None
+import metrics
+from llm_helper import get_pool
+from few_shot import PROCESSED, get_few_shot
+from response_cache import ResponseCache
+from tenants import corpus_path as tenant_corpus
+
+# Every call goes through the process-wide pool (lazy init, concurrency
+# limit, timeouts). Generation never coalesces: each call is a fresh sample.
 def _model():
-    global _LLM
-    if _LLM is None:
-        _LLM = get_llm()
-    return _LLM
+    return get_pool()
+
+# On-disk cache of completions, shared by every session in the process.
+# RESPONSE_CACHE_VARIANTS > 1 keeps that many variants for hot keys.
+_CACHE = None
+def _cache() -> ResponseCache:
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = ResponseCache(pool_size=int(os.getenv("RESPONSE_CACHE_VARIANTS", "1")))
+    return _CACHE
+
+# (min_lines, max_lines) per requested length
+LENGTH_MAP = {
+    "Short":  (1, 5),
+    "Medium": (6, 10),
+    "Long":   (11, 15),
+}
+LANGUAGES = ("English", "Hinglish")
+# Common preambles stripped from the first line of the output
+BAD_STARTS = ("Here's", "This is", "Below is", "Here is")
+# Completion budget per line of the cap, plus room for a preamble line;
+# generous, so the line cap (not max_tokens) is what normally ends a post
+TOKENS_PER_LINE = 40
+PREAMBLE_TOKENS = 60
+
+# Outputs this similar (estimated Jaccard over word 3-grams) to a corpus post
+# count as copies of it and are regenerated, uncached, up to MAX_REGENERATIONS times
+COPY_THRESHOLD = 0.8
+MAX_REGENERATIONS = 1
+
+def get_max_tokens(length: str, enforce_length: bool = True) -> int | None:
+    """max_tokens for a requested length, or None when output is not capped."""
+    max_lines = LENGTH_MAP.get(length, (None, None))[1]
+    if not enforce_length or not max_lines:
+        return None
+    return max_lines * TOKENS_PER_LINE + PREAMBLE_TOKENS
 
 def get_length_str(length: str) -> str:
     if length == "Short":
@@ -32,7 +71,46 @@ def get_length_str(length: str) -> str:
         return "11 to 15 lines"
     return "1 to 10 lines"
 
-def get_prompt(length: str, language: str, tag: str) -> str:
+def parse_spec(body) -> dict:
+    """
+    Validated {length, language, tag, tenant} from a request or batch row;
+    length and language default to Medium and English. ValueError says
+    what is wrong.
+    """
+    if not isinstance(body, dict):
+        raise ValueError("expected a JSON object")
+    length, language, tag = body.get("length", "Medium"), body.get("language", "English"), body.get("tag")
+    if length not in LENGTH_MAP:
+        raise ValueError(f"length must be one of {', '.join(LENGTH_MAP)}")
+    if language not in LANGUAGES:
+        raise ValueError(f"language must be one of {', '.join(LANGUAGES)}")
+    if not isinstance(tag, str) or not tag.strip():
+        raise ValueError("tag is required")
+    tenant = body.get("tenant") or None
+    if tenant is not None:
+        if not isinstance(tenant, str):
+            raise ValueError("tenant must be a string")
+        if not tenant_corpus(tenant).exists():
+            raise ValueError(f"unknown tenant: {tenant}")
+    return {"length": length, "language": language, "tag": tag.strip(), "tenant": tenant}
+
+def _resolve_corpus(corpus_path: str | Path, tenant: str | None) -> str | Path:
+    # a tenant id wins over an explicit path; raises ValueError for bad ids
+    return tenant_corpus(tenant) if tenant else corpus_path
+
+def get_prompt(length: str, language: str, tag: str, corpus_path: str | Path = PROCESSED,
+               tenant: str | None = None) -> str:
+    with metrics.span("prompt.assemble"):
+        return _build_prompt(length, language, tag, _resolve_corpus(corpus_path, tenant))
+
+def warm_prompts(corpus_path: str | Path = PROCESSED, tenant: str | None = None) -> None:
+    """Rank get_prompt's examples for every tag and length before the first request."""
+    corpus_path = _resolve_corpus(corpus_path, tenant)
+    for tag in sorted(get_few_shot(corpus_path).get_tags() or []):
+        for length in LENGTH_MAP:
+            get_prompt(length, "English", tag, corpus_path)
+
+def _build_prompt(length: str, language: str, tag: str, corpus_path: str | Path) -> str:
     length_str = get_length_str(length)
     prompt = f"""
 Generate a LinkedIn post using the below Information.
@@ -50,18 +128,18 @@ Generate a LinkedIn post using the below Information.
 - Do NOT write any preamble like "Here’s a post", "This is a sample", "Below is...", etc.
 - Directly output only the LinkedIn post content.
 """
-    few_shot = FewShotPosts()
-
-    # Main attempt (ignore language to avoid over-filtering)
-    examples = few_shot.get_filtered_posts(length, None, tag)
-
-    # Fallback 1: by tag only
-    if len(examples) == 0:
-        examples = few_shot.get_filtered_posts(None, None, tag)
+    few_shot = get_few_shot(corpus_path)
 
-    # Fallback 2: by length only
-    if len(examples) == 0:
-        examples = few_shot.get_filtered_posts(length, None)
+    # Main attempt (ignore language to avoid over-filtering), then
+    # fallback 1: by tag only, fallback 2: by length only; the matches are
+    # ranked by relevance to the topic and engagement
+    examples = few_shot.get_examples(
+        tag,
+        (length, None, tag),
+        (None, None, tag),
+        (length, None),
+        k=1,
+    )
 
     if len(examples) > 0:
         prompt += "\n4) Use the writing style as per the following example"
@@ -74,22 +152,17 @@ Generate a LinkedIn post using the below Information.
 
     return prompt.strip()
 
-def generate_post(length: str, language: str, tag: str, enforce_length: bool = True) -> str:
-    prompt = get_prompt(length, language, tag)
 
-    # Invoke LLM (lazy init, works with st.secrets or .env via llm_helper)
-    llm = _model()
-    response = llm.invoke(prompt)
-    output = (response.content or "").strip()
+def _clean_output(output: str, length: str, enforce_length: bool = True) -> str:
+    with metrics.span("postprocess"):
+        return _clean(output, length, enforce_length)
+
+def _clean(output: str, length: str, enforce_length: bool) -> str:
+    output = (output or "").replace("\r\n", "\n").strip()
 
     # Enforce length bounds by line count
     if enforce_length:
-        length_map = {
-            "Short":  (1, 5),
-            "Medium": (6, 10),
-            "Long":   (11, 15),
-        }
-        _, max_lines = length_map.get(length, (None, None))
+        _, max_lines = LENGTH_MAP.get(length, (None, None))
         if max_lines:
             lines = [line for line in output.splitlines() if line.strip()]
             if len(lines) > max_lines:
@@ -97,13 +170,270 @@ def generate_post(length: str, language: str, tag: str, enforce_length: bool = T
             output = "\n".join(lines).strip()
 
     # Remove common preambles if they sneak in
-    bad_starts = ("Here's", "This is", "Below is", "Here is")
-    for bad in bad_starts:
+    for bad in BAD_STARTS:
         if output.startswith(bad):
             output = "\n".join(output.splitlines()[1:]).strip()
             break
 
     return output
 
+class StreamCleaner:
+    """
+    Incremental version of _clean_output for streamed completions.
+
+    feed() takes raw chunks and returns the cleaned text that is safe to show
+    so far; finish() flushes the rest. The concatenated output equals
+    _clean_output() on the full completion whenever its line breaks are \n
+    or \r\n (the rarer separators str.splitlines() knows are not lines
+    here). Once the line cap is reached, done is set and the caller can
+    stop reading the stream.
+    """
+    def __init__(self, length: str, enforce_length: bool = True):
+        self.max_lines = LENGTH_MAP.get(length, (None, None))[1] if enforce_length else None
+        self.done = False
+        self._buf = ""        # current, incomplete line
+        self._state = None    # None (undecided), "emit" or "drop"
+        self._pos = 0         # chars of the current line already emitted
+        self._line_started = False
+        self._started = False  # anything emitted yet
+        self._pending = ""    # held trailing whitespace / blank lines
+        self._first = True    # first non-blank line still to be seen
+        self._lines = 0       # non-blank lines consumed (for the cap)
+
+    def _decide(self, text: str, complete: bool) -> str | None:
+        stripped = text.lstrip()
+        if not stripped.strip():
+            return "blank" if complete else None
+        if self._first:
+            if any(stripped.startswith(bad) for bad in BAD_STARTS):
+                state = "drop"
+            elif not complete and any(bad.startswith(stripped) for bad in BAD_STARTS):
+                return None  # could still turn into a preamble
+            else:
+                state = "emit"
+            self._first = False
+        else:
+            state = "emit"
+        self._lines += 1
+        return state
+
+    def _emit(self, text: str) -> str:
+        out = ""
+        if not self._line_started:
+            self._line_started = True
+            if self._started:
+                out, self._pending = self._pending + "\n", ""
+            else:
+                self._pos = len(text) - len(text.lstrip())
+                self._started = True
+        end = len(text.rstrip())
+        if end > self._pos:
+            out += text[self._pos:end]
+            self._pos = end
+        return out
+
+    def _finish_line(self, line: str) -> str:
+        if line.endswith("\r"):
+            line = line[:-1]  # CRLF; _clean normalises it to \n too
+        state = self._state or self._decide(line, complete=True)
+        out = ""
+        if state == "blank":
+            if self.max_lines is None and self._started:
+                self._pending += "\n" + line
+        elif state == "emit":
+            out = self._emit(line)
+            self._pending = line[self._pos:]
+        if state != "blank" and self.max_lines and self._lines >= self.max_lines:
+            self.done = True
+        self._state, self._pos, self._line_started = None, 0, False
+        return out
+
+    def feed(self, chunk: str) -> str:
+        if self.done:
+            return ""
+        self._buf += chunk
+        out = []
+        while "\n" in self._buf and not self.done:
+            line, self._buf = self._buf.split("\n", 1)
+            out.append(self._finish_line(line))
+        if not self.done:
+            if self._state is None:
+                self._state = self._decide(self._buf, complete=False)
+            if self._state == "emit":
+                out.append(self._emit(self._buf))
+        return "".join(out)
+
+    def finish(self) -> str:
+        if self.done or not self._buf:
+            return ""
+        line, self._buf = self._buf, ""
+        return self._finish_line(line)
+
+def _stream_raw(llm, prompt: str, length: str, enforce_length: bool, raw: list):
+    """
+    Stream a completion bounded by get_max_tokens, yielding cleaned text and
+    appending raw chunks to raw. Reading stops (which cancels the upstream
+    request) as soon as StreamCleaner has the capped number of lines.
+    """
+    max_tokens = get_max_tokens(length, enforce_length)
+    cleaner = StreamCleaner(length, enforce_length)
+    started = time.perf_counter()
+    usage = None
+    try:
+        for chunk in llm.stream(prompt, **({"max_tokens": max_tokens} if max_tokens else {})):
+            if not raw:
+                metrics.observe("llm.first_token", time.perf_counter() - started)
+            if getattr(chunk, "usage_metadata", None):
+                usage = chunk  # providers report usage on the last chunk
+            raw.append(chunk.content or "")
+            text = cleaner.feed(chunk.content or "")
+            if text:
+                yield text
+            if cleaner.done:
+                # tokens of the budget we did not wait for or pay for (~4 chars/token)
+                if max_tokens:
+                    metrics.incr("early_stops")
+                    metrics.incr("tokens_saved", max(0, max_tokens - len("".join(raw)) // 4))
+                break  # closing the stream stops the upstream generation
+        tail = cleaner.finish()
+        if tail:
+            yield tail
+    finally:
+        # a stream cut off at the line cap never sees the usage chunk
+        if usage is not None:
+            metrics.record_usage(usage)
+        else:
+            metrics.record_estimated_usage(prompt, "".join(raw))
+        metrics.observe("llm.stream", time.perf_counter() - started)
+
+def _complete(llm, prompt: str, length: str, enforce_length: bool = True) -> str:
+    """Raw completion for prompt; bounded and cut off at the line cap when enforced."""
+    if get_max_tokens(length, enforce_length) is None:
+        with metrics.span("llm.call"):
+            response = llm.invoke(prompt)
+        metrics.record_usage(response)
+        return response.content or ""
+    raw = []
+    with metrics.span("llm.call"):
+        for _ in _stream_raw(llm, prompt, length, enforce_length, raw):
+            pass
+    return "".join(raw)
+
+def _cache_key(cache: ResponseCache, llm, prompt: str, max_tokens: int | None) -> str:
+    model = getattr(llm, "model_name", None)
+    if max_tokens:
+        # capped completions may stop at the line cap, so don't share them with uncapped callers
+        model = f"{model}|max_tokens={max_tokens}"
+    return cache.key(prompt, model, getattr(llm, "temperature", None))
+
+def _copies_corpus(post: str, corpus_path: str | Path) -> bool:
+    rows, _ = get_few_shot(corpus_path).find_near_duplicates(post, COPY_THRESHOLD)
+    if len(rows):
+        metrics.incr("near_copies")
+        return True
+    return False
+
+def _avoid_copy(raw: str, complete, length: str, enforce_length: bool,
+                corpus_path: str | Path) -> tuple[str, str]:
+    """
+    Regenerate while the cleaned post nearly copies a corpus example
+    (bounded). Returns (post, raw completion it was cleaned from).
+    """
+    post = _clean_output(raw, length, enforce_length)
+    for _ in range(MAX_REGENERATIONS):
+        if not _copies_corpus(post, corpus_path):
+            break
+        metrics.incr("near_copy_regenerations")
+        raw = complete()
+        post = _clean_output(raw, length, enforce_length)
+    return post, raw
+
+def generate_post(length: str, language: str, tag: str, enforce_length: bool = True,
+                  use_cache: bool = True, corpus_path: str | Path = PROCESSED,
+                  tenant: str | None = None) -> str:
+    corpus_path = _resolve_corpus(corpus_path, tenant)
+    prompt = get_prompt(length, language, tag, corpus_path)
+
+    # Invoke LLM (lazy init, works with st.secrets or .env via llm_helper)
+    llm = _model()
+    complete = lambda: _complete(llm, prompt, length, enforce_length)
+
+    if not use_cache:
+        return _avoid_copy(complete(), complete, length, enforce_length, corpus_path)[0]
+
+    cache = _cache()
+    key = _cache_key(cache, llm, prompt, get_max_tokens(length, enforce_length))
+    output = cache.get(key)
+    metrics.incr("cache_hits" if output is not None else "cache_misses")
+    if output is None:
+        output = complete()
+        cache.put(key, output)
+    # keep a few variants ready so repeat requests stay instant but varied
+    cache.refill(key, complete)
+
+    post, final = _avoid_copy(output, complete, length, enforce_length, corpus_path)
+    if final is not output:
+        # don't pay for the same regeneration on every hit of a copying variant
+        cache.replace(key, output, final)
+    return post
+
+async def agenerate_post(length: str, language: str, tag: str, enforce_length: bool = True,
+                         tenant: str | None = None) -> str:
+    """Async, uncached generate_post for batch callers that want fresh posts."""
+    corpus_path = _resolve_corpus(PROCESSED, tenant)
+    prompt = get_prompt(length, language, tag, corpus_path)
+    max_tokens = get_max_tokens(length, enforce_length)
+
+    async def complete() -> str:
+        with metrics.span("llm.call"):
+            response = await _model().ainvoke(prompt, **({"max_tokens": max_tokens} if max_tokens else {}))
+        metrics.record_usage(response)
+        return _clean_output(response.content or "", length, enforce_length)
+
+    post = await complete()
+    for _ in range(MAX_REGENERATIONS):
+        if not _copies_corpus(post, corpus_path):
+            break
+        metrics.incr("near_copy_regenerations")
+        post = await complete()
+    return post
+
+def stream_post(length: str, language: str, tag: str, enforce_length: bool = True,
+                use_cache: bool = True, tenant: str | None = None):
+    """
+    Like generate_post, but yields cleaned text chunks as the model produces
+    them. Cache hits are yielded in one piece.
+    """
+    corpus_path = _resolve_corpus(PROCESSED, tenant)
+    prompt = get_prompt(length, language, tag, corpus_path)
+    llm = _model()
+    if not use_cache:
+        raw = []
+        yield from _stream_raw(llm, prompt, length, enforce_length, raw)
+        # already shown, so a copy can only be counted
+        _copies_corpus(_clean_output("".join(raw), length, enforce_length), corpus_path)
+        return
+    cache = _cache()
+    key = _cache_key(cache, llm, prompt, get_max_tokens(length, enforce_length))
+    complete = lambda: _complete(llm, prompt, length, enforce_length)
+
+    cached = cache.get(key)
+    metrics.incr("cache_hits" if cached is not None else "cache_misses")
+    if cached is not None:
+        post = _clean_output(cached, length, enforce_length)
+        if not _copies_corpus(post, corpus_path):
+            cache.refill(key, complete)
+            yield post
+            return
+        cache.replace(key, cached, None)  # stream a fresh one instead
+
+    raw = []
+    yield from _stream_raw(llm, prompt, length, enforce_length, raw)
+    if _copies_corpus(_clean_output("".join(raw), length, enforce_length), corpus_path):
+        return  # already shown; just keep it out of the cache
+
+    cache.put(key, "".join(raw))
+    cache.refill(key, complete)
+
 if __name__ == "__main__":
     print(generate_post("Long", "English", "Productivity"))
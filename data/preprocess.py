@@ -9,33 +9,135 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import argparse
+import asyncio
+import difflib
+import hashlib
 import json
+import re
+import time
+from itertools import chain
 from pathlib import Path
 
+import numpy as np
+import pandas as pd
+
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.exceptions import OutputParserException
 
+import metrics
+from corpus_io import read_posts
+from manifest import write_manifest_from_posts
+from near_dup import MinHashIndex, dedupe as dedupe_texts
+from tenants import tenant_dir
+
 # import LLM
-from llm_helper import llm
+from llm_helper import RateLimiter, coalesce_kwargs, get_pool, with_retries
 
 #  Paths 
 BASE_DIR = Path(__file__).resolve().parent         
 RAW_PATH = BASE_DIR / "raw_posts.json"              
 PROCESSED_PATH = BASE_DIR / "processed_posts.json"  
+CHECKPOINT_PATH = BASE_DIR / "metadata_checkpoint.jsonl"
+TAG_MAPPING_PATH = BASE_DIR / "tag_mapping.json"
+
+
+class MetadataCheckpoint:
+    """
+    Append-only JSONL store of extracted metadata, keyed by a hash of the
+    post text and the extraction prompt. Every result is flushed as soon as
+    it arrives, so an interrupted run resumes where it stopped.
+    """
+    def __init__(self, path: Path = CHECKPOINT_PATH):
+        self.path = Path(path)
+        self._entries: dict[str, dict] = {}
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn last line from a crash
+                    self._entries[record["key"]] = record["metadata"]
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(f"{PROMPT_VERSION}\n{text}".encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> dict | None:
+        return self._entries.get(self.key(text))
+
+    def put(self, text: str, metadata: dict) -> None:
+        key = self.key(text)
+        self._entries[key] = metadata
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"key": key, "metadata": metadata}, ensure_ascii=False) + "\n")
 
 
 def process_post(raw_file_path: Path = RAW_PATH,
-                 processed_file_path: Path = PROCESSED_PATH) -> None:
-    enriched_posts = []
+                 processed_file_path: Path = PROCESSED_PATH,
+                 concurrency: int = 1,
+                 rpm: int | None = None,
+                 tpm: int | None = None,
+                 llm=None,
+                 checkpoint_path: Path = CHECKPOINT_PATH,
+                 tag_mapping_path: Path = TAG_MAPPING_PATH,
+                 dedupe: bool = True,
+                 pack_tokens: int = 0) -> None:
+    """
+    Enrich raw posts with LLM metadata and write the processed corpus.
+    With dedupe, reposts and lightly edited copies are dropped first (the
+    most engaged copy is kept), so they cost no LLM call and don't skew
+    few-shot selection. Only posts missing from the checkpoint store are
+    sent to the LLM.
+    With concurrency > 1 the extraction calls run concurrently (bounded,
+    rate-limited, retried on 429/5xx); output order always matches input.
+    With pack_tokens > 0 several posts (up to that many tokens) share one
+    request, see extract_metadata_packed.
+    """
+    llm = llm or get_pool()
+    checkpoint = MetadataCheckpoint(checkpoint_path)
+
+    # enrich posts with metadata (raw file may be .json or .jsonl)
+    posts = read_posts(raw_file_path)
+    if dedupe:
+        with metrics.span("preprocess.dedupe"):
+            texts = [post.get("text") or "" for post in posts]
+            # signatures persist next to the raw file: a run only signs the posts appended since
+            index = MinHashIndex.load_or_build(Path(raw_file_path).with_suffix(".minhash"), texts)
+            keep = dedupe_texts(texts, priority=[post.get("engagement") for post in posts],
+                                sigs=np.asarray(index.sigs))
+        if len(keep) < len(posts):
+            print(f"Dropped {len(posts) - len(keep)} near-duplicate posts")
+            posts = [posts[i] for i in keep.tolist()]
 
-    # enrich posts with metadata
-    with open(raw_file_path, encoding="utf-8") as file:
-        posts = json.load(file)
-        for post in posts:
-            metadata = extract_metadata(post["text"])
-            post_with_metadata = post | metadata
-            enriched_posts.append(post_with_metadata)
+    pending = [post["text"] for post in posts if checkpoint.get(post["text"]) is None]
+    pending = list(dict.fromkeys(pending))  # identical reposts are extracted once
+    print(f"{len(posts) - len(pending)} posts cached, {len(pending)} to extract")
+
+    started = time.perf_counter()
+    if pack_tokens > 0:
+        asyncio.run(extract_metadata_packed(
+            pending, llm, max_concurrency=concurrency, rpm=rpm, tpm=tpm,
+            on_result=lambda i, meta: checkpoint.put(pending[i], meta),
+            pack_tokens=pack_tokens,
+        ))
+    elif concurrency > 1:
+        asyncio.run(extract_metadata_concurrent(
+            pending, llm, max_concurrency=concurrency, rpm=rpm, tpm=tpm,
+            on_result=lambda i, meta: checkpoint.put(pending[i], meta),
+        ))
+    else:
+        for text in pending:
+            checkpoint.put(text, extract_metadata(text, llm))
+    elapsed = time.perf_counter() - started
+    metrics.observe("preprocess.extract_all", elapsed)
+    if pending:
+        print(f"Extracted metadata for {len(pending)} posts in {elapsed:.1f}s "
+              f"({len(pending) / max(elapsed, 1e-9):.2f} posts/s)")
+
+    enriched_posts = [post | checkpoint.get(post["text"]) for post in posts]
 
     #  unify tags 
     canonical_tags = [
@@ -48,20 +150,22 @@ def process_post(raw_file_path: Path = RAW_PATH,
         "Personal Growth",
         "Mindset",
     ]
-    tag_mapping = get_unified_tag_mapping(enriched_posts, canonical_tags)
+    tag_mapping = get_unified_tag_mapping(enriched_posts, canonical_tags, llm,
+                                          cache_path=tag_mapping_path,
+                                          max_concurrency=concurrency)
     enriched_posts = apply_unified_tags(enriched_posts, tag_mapping)
 
     #  processed output
     with open(processed_file_path, "w", encoding="utf-8") as f:
         json.dump(enriched_posts, f, ensure_ascii=False, indent=2)
+    write_manifest_from_posts(processed_file_path, enriched_posts)
 
     # print preview
     for epost in enriched_posts:
         print(epost)
 
 
-def extract_metadata(post: str) -> dict:
-    template = '''
+METADATA_TEMPLATE = '''
     You are given a LinkedIn post. You need to extract number of lines, language of the post and tags.
     1. Return a valid JSON. No preamble.
     2. JSON object should have exactly three keys: line_count, language and tags.
@@ -72,14 +176,36 @@ def extract_metadata(post: str) -> dict:
     Here is the actual post on which you need to perform this task:
     {post}
     '''
+# bump automatically whenever the extraction prompt changes
+PROMPT_VERSION = hashlib.sha256(METADATA_TEMPLATE.encode("utf-8")).hexdigest()[:12]
+
+# Several posts per request: the instructions are sent once per pack instead
+# of once per post. Answers are the same objects as METADATA_TEMPLATE's plus
+# the post id, so packed results share the checkpoint with single-post ones.
+PACKED_METADATA_TEMPLATE = '''
+    You are given several LinkedIn posts. For each post you need to extract number of lines, language and tags.
+    1. Return a valid JSON array. No preamble.
+    2. One JSON object per post, each with exactly four keys: id, line_count, language and tags. id is the number from the post's <post id="..."> marker.
+    3. tags is an array of text tags. Extract maximum two tags.
+    4. Language should be English or Hinglish (Hinglish means Hindi + English).
+    5. For tags, pick from themes like: entrepreneurship, business, leadership, motivation, finance, productivity, personal growth, mindset.
+
+    Here are the posts on which you need to perform this task:
+    {posts}
+    '''
+PACK_TOKENS = 2000  # post text per packed request (~4 chars per token)
+PACK_MAX_POSTS = 16  # keeps the JSON answer well short of the completion limit
+METADATA_KEYS = ("line_count", "language", "tags")
+
+# built once; formatting and parsing are stateless
+METADATA_PROMPT = PromptTemplate.from_template(METADATA_TEMPLATE)
+PACKED_METADATA_PROMPT = PromptTemplate.from_template(PACKED_METADATA_TEMPLATE)
+_JSON_PARSER = JsonOutputParser()
 
-    pt = PromptTemplate.from_template(template)
-    chain = pt | llm
-    response = chain.invoke(input={"post": post})
 
+def _parse_metadata(content: str) -> dict:
     try:
-        json_parser = JsonOutputParser()
-        res = json_parser.parse(response.content)
+        res = _JSON_PARSER.parse(content)
     except OutputParserException:
         
         raise OutputParserException("Context too big. Unable to parse jobs.")
@@ -87,23 +213,160 @@ def extract_metadata(post: str) -> dict:
     return res
 
 
-def get_unified_tag_mapping(posts_with_metadata: list, canonical_tags: list) -> dict:
+def extract_metadata(post: str, llm=None) -> dict:
+    with metrics.span("preprocess.extract"):
+        llm = llm or get_pool()
+        response = llm.invoke(METADATA_PROMPT.format(post=post), **coalesce_kwargs(llm))
+    metrics.record_usage(response)
+    return _parse_metadata(response.content)
+
+
+async def aextract_metadata(post: str, llm=None) -> dict:
+    with metrics.span("preprocess.extract"):
+        llm = llm or get_pool()
+        response = await llm.ainvoke(METADATA_PROMPT.format(post=post), **coalesce_kwargs(llm))
+    metrics.record_usage(response)
+    return _parse_metadata(response.content)
+
+
+def _pack_posts(posts: list[str], pack_tokens: int = PACK_TOKENS,
+                max_posts: int = PACK_MAX_POSTS) -> list[list[int]]:
+    """Split post indices into consecutive packs of at most pack_tokens / max_posts."""
+    packs, current, used = [], [], 0
+    for i, post in enumerate(posts):
+        cost = len(post) // 4 + 1
+        if current and (used + cost > pack_tokens or len(current) >= max_posts):
+            packs.append(current)
+            current, used = [], 0
+        current.append(i)
+        used += cost
+    if current:
+        packs.append(current)
+    return packs
+
+
+def _format_pack(posts: list[str]) -> str:
+    body = "\n\n".join(f'<post id="{i}">\n{post}\n</post>' for i, post in enumerate(posts))
+    return PACKED_METADATA_PROMPT.format(posts=body)
+
+
+def _parse_packed_metadata(content: str, n: int) -> dict[int, dict]:
+    """{position: metadata} for every well-formed answer; malformed ones are left out."""
+    items = _JSON_PARSER.parse(content)
+    if isinstance(items, dict):
+        items = items.get("posts", [items])
+    results = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict) or any(k not in item for k in METADATA_KEYS):
+            continue
+        try:
+            pos = int(item["id"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if 0 <= pos < n:
+            results[pos] = {k: item[k] for k in METADATA_KEYS}
+    return results
+
+
+async def extract_metadata_concurrent(posts: list[str], llm=None,
+                                      max_concurrency: int = 8,
+                                      rpm: int | None = None,
+                                      tpm: int | None = None,
+                                      max_retries: int = 5,
+                                      on_result=None) -> list[dict]:
     """
-    Ask the LLM to map every observed (original) tag to one canonical tag.
-    Returns a dict: {original_tag: unified_canonical_tag}
+    Extract metadata for many posts at once. At most max_concurrency calls are
+    in flight, requests are paced to the rpm/tpm quotas, and 429/5xx errors
+    are retried with jittered backoff. Results are returned in input order;
+    on_result(index, metadata) is also called as each one completes.
     """
-    # collect unique tags
-    unique_tags = set()
-    for post in posts_with_metadata:
-        for t in post.get("tags", []):
-            if t is not None:
-                unique_tags.add(str(t).strip())
+    llm = llm or get_pool()
+    limiter = RateLimiter(rpm=rpm, tpm=tpm)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    # rough prompt + completion estimate (~4 chars per token)
+    overhead = len(METADATA_TEMPLATE) // 4 + 100
 
-    unique_tags_list = ", ".join(sorted(unique_tags))
-    canonical_list = ", ".join(canonical_tags)
+    async def run(i: int, post: str) -> dict:
+        async def attempt() -> dict:
+            await limiter.acquire(overhead + len(post) // 4)
+            return await aextract_metadata(post, llm)
+
+        async with semaphore:
+            res = await with_retries(attempt, max_retries)
+        if on_result is not None:
+            on_result(i, res)
+        return res
+
+    return await asyncio.gather(*(run(i, post) for i, post in enumerate(posts)))
+
+
+async def extract_metadata_packed(posts: list[str], llm=None,
+                                  max_concurrency: int = 8,
+                                  rpm: int | None = None,
+                                  tpm: int | None = None,
+                                  max_retries: int = 5,
+                                  on_result=None,
+                                  pack_tokens: int = PACK_TOKENS,
+                                  max_posts: int = PACK_MAX_POSTS) -> list[dict]:
+    """
+    Like extract_metadata_concurrent, but sends up to pack_tokens of posts per
+    request. When an answer is truncated or can't be parsed, the pack is split
+    in half and retried; posts missing from an otherwise good answer are
+    retried on their own. A pack of one falls back to the single-post prompt.
+    """
+    llm = llm or get_pool()
+    limiter = RateLimiter(rpm=rpm, tpm=tpm)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    overhead = len(PACKED_METADATA_TEMPLATE) // 4 + 100
+    results: list[dict | None] = [None] * len(posts)
+
+    def done(i: int, res: dict) -> None:
+        results[i] = res
+        if on_result is not None:
+            on_result(i, res)
+
+    async def call(prompt: str, tokens: int):
+        async def attempt():
+            await limiter.acquire(tokens)
+            with metrics.span("preprocess.extract"):
+                return await llm.ainvoke(prompt, **coalesce_kwargs(llm))
 
-    # prompt 
-    template = '''
+        async with semaphore:
+            return await with_retries(attempt, max_retries)
+
+    async def run(ids: list[int]) -> None:
+        if len(ids) == 1:
+            post = posts[ids[0]]
+            response = await call(METADATA_PROMPT.format(post=post), overhead + len(post) // 4)
+            metrics.record_usage(response)
+            done(ids[0], _parse_metadata(response.content))
+            return
+        pack = [posts[i] for i in ids]
+        response = await call(_format_pack(pack), overhead + sum(len(p) for p in pack) // 4 + 40 * len(pack))
+        metrics.record_usage(response)
+        answered = {}
+        if (response.response_metadata or {}).get("finish_reason") != "length":
+            try:
+                answered = _parse_packed_metadata(response.content, len(ids))
+            except OutputParserException:
+                pass
+        for pos, res in answered.items():
+            done(ids[pos], res)
+        missing = [i for pos, i in enumerate(ids) if pos not in answered]
+        if not missing:
+            return
+        metrics.incr("pack_splits")
+        if len(missing) < len(ids):
+            await run(missing)
+        else:
+            half = len(ids) // 2
+            await asyncio.gather(run(ids[:half]), run(ids[half:]))
+
+    await asyncio.gather(*(run(ids) for ids in _pack_posts(posts, pack_tokens, max_posts)))
+    return results
+
+
+TAG_MAPPING_TEMPLATE = '''
 I will give you a list of tags. You need to unify tags with the following requirements.
 
 1. Tags are unified and merged to create a shorter list.
@@ -122,18 +385,86 @@ I will give you a list of tags. You need to unify tags with the following requir
 Here is the list of tags to unify:
 {tags}
 '''
-    pt = PromptTemplate.from_template(template)
-    chain = pt | llm
-    response = chain.invoke(
-        input={
-            "tags": unique_tags_list,
-            "canonical": canonical_list,
-        }
-    )
+TAG_MAPPING_PROMPT = PromptTemplate.from_template(TAG_MAPPING_TEMPLATE)
+TAG_SHARD_CHARS = 4000  # tag list characters per LLM call
+FUZZY_CUTOFF = 0.92     # difflib ratio for merging near-identical tags locally
+
+_TAG_PUNCT = re.compile(r"[^\w\s]+|_")
+_DIGITS = re.compile(r"\d+")
+
+
+def _singular(word: str) -> str:
+    if len(word) <= 3 or word.endswith(("ss", "us", "is")):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("ches", "shes", "xes", "sses")):
+        return word[:-2]
+    return word[:-1] if word.endswith("s") else word
+
+
+def normalize_tag(tag: str) -> str:
+    """Case-, punctuation- and plural-insensitive key for a tag."""
+    words = _TAG_PUNCT.sub(" ", str(tag).casefold()).split()
+    return " ".join(_singular(w) for w in words)
+
+
+def premerge_tags(tags, canonical_tags: list) -> tuple[dict, dict]:
+    """
+    Collapse obvious duplicates without the LLM. Returns (resolved, groups):
+    resolved maps tags that match a canonical tag (exactly or fuzzily, after
+    normalization) to it; groups maps every other tag to a representative
+    original tag, so only one tag per cluster has to be sent to the LLM.
+    """
+    canonical = {normalize_tag(c): c for c in canonical_tags}
+    canonical_keys = list(canonical)
+    resolved, groups = {}, {}
+    reps: dict[str, str] = {}                # normalized key -> representative tag
+    buckets: dict[tuple, list[str]] = {}     # (letter, numbers, length band) -> cluster keys
+    for tag in sorted(tags):
+        key = normalize_tag(tag)
+        if not key:
+            continue
+        match = canonical.get(key)
+        if match is None:
+            close = difflib.get_close_matches(key, canonical_keys, n=1, cutoff=FUZZY_CUTOFF)
+            match = canonical[close[0]] if close else None
+        if match is not None:
+            resolved[tag] = match
+            continue
+        if key not in reps:
+            # only compare against clusters with the same first letter, the
+            # same numbers ("Web2" and "Web3" are not typos of each other) and
+            # a similar length; keeps the pass far from quadratic
+            block = (key[0], tuple(_DIGITS.findall(key)))
+            band = len(key) // 4
+            near = [k for b in (band - 1, band, band + 1) for k in buckets.get((*block, b), ())]
+            close = difflib.get_close_matches(key, near, n=1, cutoff=FUZZY_CUTOFF)
+            if close:
+                reps[key] = reps[close[0]]
+            else:
+                reps[key] = tag
+                buckets.setdefault((*block, band), []).append(key)
+        groups[tag] = reps[key]
+    return resolved, groups
+
 
+def _tag_shards(tags: list, max_chars: int) -> list:
+    shards, shard, size = [], [], 0
+    for tag in tags:
+        if shard and size + len(tag) + 2 > max_chars:
+            shards.append(shard)
+            shard, size = [], 0
+        shard.append(tag)
+        size += len(tag) + 2
+    if shard:
+        shards.append(shard)
+    return shards
+
+
+def _parse_tag_mapping(content: str) -> dict:
     try:
-        json_parser = JsonOutputParser()
-        mapping = json_parser.parse(response.content)
+        mapping = _JSON_PARSER.parse(content)
     except OutputParserException:
         raise OutputParserException("Failed to parse tag mapping from LLM response.")
 
@@ -147,20 +478,140 @@ Here is the list of tags to unify:
     return cleaned
 
 
+async def map_tags_sharded(tags: list, canonical_tags: list, llm=None,
+                           max_concurrency: int = 8,
+                           shard_chars: int = TAG_SHARD_CHARS,
+                           max_retries: int = 5) -> dict:
+    """Ask the LLM for {tag: canonical} in size-bounded shards, concurrently."""
+    llm = llm or get_pool()
+    canonical_list = ", ".join(canonical_tags)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(shard: list) -> dict:
+        prompt = TAG_MAPPING_PROMPT.format(tags=", ".join(shard), canonical=canonical_list)
+        async def attempt():
+            with metrics.span("preprocess.tag_mapping"):
+                return await llm.ainvoke(prompt, **coalesce_kwargs(llm))
+
+        async with semaphore:
+            response = await with_retries(attempt, max_retries)
+        metrics.record_usage(response)
+        return _parse_tag_mapping(response.content)
+
+    mapping = {}
+    for part in await asyncio.gather(*(run(shard) for shard in _tag_shards(tags, shard_chars))):
+        mapping.update(part)
+    return mapping
+
+
+def _load_tag_mapping(cache_path: Path | None, canonical_tags: list) -> dict:
+    if cache_path is None or not Path(cache_path).exists():
+        return {}
+    try:
+        cached = json.loads(Path(cache_path).read_text(encoding="utf-8"))
+    except ValueError:
+        return {}
+    # files from before sharding have no "canonical" entry; their mapping is still valid
+    if cached.get("canonical", list(canonical_tags)) != list(canonical_tags):
+        return {}
+    return dict(cached.get("mapping") or {})
+
+
+def _save_tag_mapping(cache_path: Path, canonical_tags: list, mapping: dict) -> None:
+    cache_path = Path(cache_path)
+    tmp = cache_path.with_suffix(".json.tmp")
+    tmp.write_text(
+        json.dumps({"canonical": list(canonical_tags), "mapping": dict(sorted(mapping.items()))},
+                   ensure_ascii=False, indent=2),
+        encoding="utf-8",
+    )
+    tmp.replace(cache_path)
+
+
+def get_unified_tag_mapping(posts_with_metadata: list, canonical_tags: list, llm=None,
+                            cache_path: Path | None = None,
+                            max_concurrency: int = 8,
+                            shard_chars: int = TAG_SHARD_CHARS) -> dict:
+    """
+    Map every observed (original) tag to one canonical tag.
+    Returns a dict: {original_tag: unified_canonical_tag}
+
+    Tags already in the persistent mapping at cache_path are not asked about
+    again. The rest go through premerge_tags, and only one representative per
+    remaining cluster is sent to the LLM, in shards of at most shard_chars.
+    The merged mapping is written back to cache_path.
+    """
+    # collect unique tags
+    unique_tags = set()
+    for post in posts_with_metadata:
+        for t in post.get("tags", []):
+            if t is not None:
+                unique_tags.add(str(t).strip())
+    unique_tags.discard("")
+
+    known = _load_tag_mapping(cache_path, canonical_tags)
+    new_tags = unique_tags - known.keys()
+    if not new_tags:
+        return {t: known[t] for t in unique_tags}
+
+    resolved, groups = premerge_tags(new_tags, canonical_tags)
+    reps = sorted(set(groups.values()))
+    if reps:
+        answers = asyncio.run(map_tags_sharded(reps, canonical_tags, llm,
+                                               max_concurrency=max_concurrency,
+                                               shard_chars=shard_chars))
+        for tag, rep in groups.items():
+            if rep in answers:
+                resolved[tag] = answers[rep]
+        # anything the LLM mapped besides the asked representatives
+        for tag, unified in answers.items():
+            resolved.setdefault(tag, unified)
+
+    known.update(resolved)
+    if cache_path is not None:
+        _save_tag_mapping(cache_path, canonical_tags, known)
+    return {t: known[t] for t in unique_tags if t in known}
+
+
 def apply_unified_tags(posts_with_metadata: list, mapping: dict) -> list:
     """
     Replace each post's tags using the LLM-provided mapping.
     De-duplicate per post while preserving order.
     """
-    out = []
-    for post in posts_with_metadata:
-        orig_tags = post.get("tags", [])
-        mapped = [mapping.get(t, t) for t in orig_tags]
-        seen = set()
-        deduped = [t for t in mapped if not (t in seen or seen.add(t))]
-        out.append({**post, "tags": deduped})
-    return out
+    tag_lists = [post.get("tags", []) or [] for post in posts_with_metadata]
+    counts = np.fromiter((len(tags) for tags in tag_lists), dtype=np.int64, count=len(tag_lists))
+    post_ids = np.repeat(np.arange(len(tag_lists)), counts)
+    flat = np.empty(len(post_ids), dtype=object)
+    flat[:] = list(chain.from_iterable(tag_lists))
+
+    mapped = pd.Series(flat).map(mapping).to_numpy(dtype=object)
+    mapped = np.where(pd.isna(mapped), flat, mapped)
+    keep = ~pd.DataFrame({"post": post_ids, "tag": mapped}).duplicated().to_numpy()
+
+    tags = mapped[keep].tolist()
+    bounds = np.zeros(len(tag_lists) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(post_ids[keep], minlength=len(tag_lists)), out=bounds[1:])
+    return [{**post, "tags": tags[a:b]}
+            for post, a, b in zip(posts_with_metadata, bounds[:-1].tolist(), bounds[1:].tolist())]
 
 
 if __name__ == "__main__":
-    process_post()
+    parser = argparse.ArgumentParser(description="Extract metadata for raw_posts.json")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="max in-flight LLM calls (1 = sequential)")
+    parser.add_argument("--rpm", type=int, default=None, help="provider requests-per-minute quota")
+    parser.add_argument("--tpm", type=int, default=None, help="provider tokens-per-minute quota")
+    parser.add_argument("--keep-duplicates", action="store_true",
+                        help="don't drop near-duplicate raw posts")
+    parser.add_argument("--pack-tokens", type=int, default=0,
+                        help=f"send several posts per request, up to this many tokens (e.g. {PACK_TOKENS}; 0 = one post per request)")
+    parser.add_argument("--tenant", default=None,
+                        help="process data/tenants/<id>/raw_posts.json instead of the default corpus")
+    args = parser.parse_args()
+    # a tenant keeps its own checkpoint and tag vocabulary next to its corpus
+    base = tenant_dir(args.tenant) if args.tenant else BASE_DIR
+    process_post(raw_file_path=base / RAW_PATH.name, processed_file_path=base / PROCESSED_PATH.name,
+                 concurrency=args.concurrency, rpm=args.rpm, tpm=args.tpm,
+                 checkpoint_path=base / CHECKPOINT_PATH.name,
+                 tag_mapping_path=base / TAG_MAPPING_PATH.name,
+                 dedupe=not args.keep_duplicates, pack_tokens=args.pack_tokens)
@@ -0,0 +1,165 @@
+# Copyright 2025 Shreya Kamalapurkar
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# data/response_cache.py
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+CACHE_PATH = Path(__file__).parent / "response_cache.sqlite3"
+
+class ResponseCache:
+    """
+    On-disk cache of raw LLM completions keyed by (prompt, model, temperature).
+
+    Each key holds up to pool_size variants that are served round-robin (one
+    by default). With a larger pool, refill() tops it up in a background
+    thread, but only for hot keys, ones served at least hot_after times, so
+    a one-off request costs a single completion. Keys are evicted
+    least-recently-used beyond max_keys, and variants expire after ttl seconds.
+    """
+    def __init__(self, path: str | Path = CACHE_PATH, max_keys: int = 500,
+                 ttl: float = 24 * 3600, pool_size: int = 1, hot_after: int = 2):
+        self.path = Path(path)
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self.pool_size = max(1, pool_size)
+        self.hot_after = hot_after
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._refilling: set[str] = set()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS keys (
+                key TEXT PRIMARY KEY,
+                last_access REAL NOT NULL,
+                cursor INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS variants (
+                key TEXT NOT NULL,
+                completion TEXT NOT NULL,
+                created REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS variants_key ON variants(key);
+        """)
+        self._db.commit()
+
+    @staticmethod
+    def key(prompt: str, model: str | None, temperature: float | None) -> str:
+        return hashlib.sha256(f"{model}\n{temperature}\n{prompt}".encode("utf-8")).hexdigest()
+
+    def _live(self, key: str) -> list[str]:
+        self._db.execute("DELETE FROM variants WHERE key = ? AND created < ?",
+                         (key, time.time() - self.ttl))
+        rows = self._db.execute("SELECT completion FROM variants WHERE key = ? ORDER BY rowid",
+                                (key,)).fetchall()
+        return [r[0] for r in rows]
+
+    def get(self, key: str) -> str | None:
+        """Next variant for key (round-robin), or None on a miss."""
+        with self._lock:
+            variants = self._live(key)
+            if not variants:
+                self.misses += 1
+                self._db.commit()
+                return None
+            cursor = self._served(key)
+            self._db.execute(
+                "INSERT INTO keys (key, last_access, cursor) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET last_access = excluded.last_access, cursor = excluded.cursor",
+                (key, time.time(), cursor + 1),
+            )
+            self._db.commit()
+            self.hits += 1
+            return variants[cursor % len(variants)]
+
+    def put(self, key: str, completion: str) -> None:
+        with self._lock:
+            if len(self._live(key)) >= self.pool_size:
+                self._db.commit()
+                return
+            now = time.time()
+            self._db.execute("INSERT INTO variants (key, completion, created) VALUES (?, ?, ?)",
+                             (key, completion, now))
+            self._db.execute(
+                "INSERT INTO keys (key, last_access) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET last_access = excluded.last_access",
+                (key, now),
+            )
+            self._evict()
+            self._db.commit()
+
+    def replace(self, key: str, old: str, new: str | None) -> None:
+        """Swap one stored variant of key for new (or drop it when new is None)."""
+        with self._lock:
+            row = self._db.execute("SELECT rowid FROM variants WHERE key = ? AND completion = ? LIMIT 1",
+                                   (key, old)).fetchone()
+            if row is not None:
+                if new is None:
+                    self._db.execute("DELETE FROM variants WHERE rowid = ?", row)
+                else:
+                    self._db.execute("UPDATE variants SET completion = ?, created = ? WHERE rowid = ?",
+                                     (new, time.time(), row[0]))
+                self._db.commit()
+
+    def _evict(self) -> None:
+        (count,) = self._db.execute("SELECT COUNT(*) FROM keys").fetchone()
+        if count <= self.max_keys:
+            return
+        stale = self._db.execute("SELECT key FROM keys ORDER BY last_access LIMIT ?",
+                                 (count - self.max_keys,)).fetchall()
+        self._db.executemany("DELETE FROM variants WHERE key = ?", stale)
+        self._db.executemany("DELETE FROM keys WHERE key = ?", stale)
+
+    def size(self, key: str) -> int:
+        with self._lock:
+            n = len(self._live(key))
+            self._db.commit()
+            return n
+
+    def _served(self, key: str) -> int:
+        row = self._db.execute("SELECT cursor FROM keys WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def refill(self, key: str, produce: Callable[[], str]) -> None:
+        """Top up a hot key's variant pool in a background thread (one per key)."""
+        if self.pool_size <= 1:
+            return
+        with self._lock:
+            if key in self._refilling or self._served(key) < self.hot_after:
+                return
+            self._refilling.add(key)
+
+        def run():
+            try:
+                while self.size(key) < self.pool_size:
+                    self.put(key, produce())
+            except Exception:
+                pass  # best-effort; the next request will retry
+            finally:
+                with self._lock:
+                    self._refilling.discard(key)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
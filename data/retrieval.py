@@ -0,0 +1,253 @@
+# Copyright 2025 Shreya Kamalapurkar
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# data/retrieval.py
+from __future__ import annotations
+
+import re
+import zlib
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+
+from corpus_io import load_or_extend, text_crc
+
+N_FEATURES = 1 << 18
+_WORD = re.compile(r"\w+")
+
+def _features(text: str) -> np.ndarray:
+    """Hashed unigram + bigram features (crc32, so stable across processes)."""
+    words = _WORD.findall((text or "").lower())
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) % N_FEATURES for g in grams),
+                       dtype=np.int64, count=len(grams))
+
+def _as_float(value) -> float:
+    try:
+        v = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return v if np.isfinite(v) else 0.0
+
+def _in_sorted(sorted_ids: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    """Mask of ids present in the sorted array sorted_ids."""
+    pos = np.searchsorted(sorted_ids, ids)
+    found = pos < len(sorted_ids)
+    found[found] = sorted_ids[pos[found]] == ids[found]
+    return found
+
+def _segment(feats: np.ndarray, rows: np.ndarray, vals: np.ndarray):
+    """(keys, ptr, rows, vals) from postings sorted by feature."""
+    keys, starts = np.unique(feats, return_index=True)
+    ptr = np.append(starts, len(feats)).astype(np.int64)
+    return keys.astype(np.uint32), ptr, rows, vals
+
+class PostIndex:
+    """
+    Hashed n-gram TF-IDF index over post texts, stored feature-major
+    (keys/ptr/rows/vals, a CSC matrix over the features that occur) so a
+    query only touches the postings of its own terms and memory grows with
+    the corpus, not with N_FEATURES. Document frequencies are the posting
+    lengths. Ranking blends similarity with an engagement prior.
+
+    append() adds new posts as an extra segment without touching the
+    existing ones; save() merges segments into one.
+    """
+    def __init__(self):
+        self.n_docs = 0
+        self.engagement = np.zeros(0, dtype=np.float32)
+        self.text_crc = np.zeros(0, dtype=np.uint32)
+        self._segments: list[tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = []
+        self._prior: np.ndarray | None = None
+        self._by_prior: np.ndarray | None = None
+
+    @classmethod
+    def build(cls, texts: list[str], engagement: Iterable | None = None) -> PostIndex:
+        index = cls()
+        index.append(texts, engagement)
+        return index
+
+    def append(self, texts: list[str], engagement: Iterable | None = None) -> None:
+        texts = list(texts)
+        if not texts:
+            return
+        rows, feats, vals = [], [], []
+        for i, text in enumerate(texts):
+            f, counts = np.unique(_features(text), return_counts=True)
+            if not len(f):
+                continue
+            w = 1.0 + np.log(counts)
+            rows.append(np.full(len(f), self.n_docs + i, dtype=np.int32))
+            feats.append(f)
+            vals.append((w / np.linalg.norm(w)).astype(np.float32))
+        if rows:
+            rows, feats, vals = np.concatenate(rows), np.concatenate(feats), np.concatenate(vals)
+            order = np.argsort(feats, kind="stable")
+            self._segments.append(_segment(feats[order], rows[order], vals[order]))
+
+        eng = np.zeros(len(texts), dtype=np.float32) if engagement is None else \
+            np.array([_as_float(e) for e in engagement], dtype=np.float32)
+        self.engagement = np.concatenate([self.engagement, eng])
+        self._prior = self._by_prior = None
+        self.text_crc = np.concatenate([self.text_crc, text_crc(texts)])
+        self.n_docs += len(texts)
+
+    def query(self, text: str, k: int = 1, candidates: np.ndarray | None = None,
+              engagement_weight: float = 0.3) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k rows for text, optionally restricted to candidate row ids.
+        Returns (row_ids, scores), best first.
+        """
+        if self.n_docs == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        f, counts = np.unique(_features(text), return_counts=True)
+        spans, df = [], np.zeros(len(f), dtype=np.int64)
+        for keys, ptr, rows, vals in self._segments:
+            if not len(keys):
+                continue
+            pos = np.minimum(np.searchsorted(keys, f), len(keys) - 1)
+            present = keys[pos] == f
+            starts = np.where(present, ptr[pos], 0)
+            ends = np.where(present, ptr[pos + 1], 0)
+            df += ends - starts
+            spans.append((starts, ends, rows, vals))
+        idf = np.log((1.0 + self.n_docs) / (1.0 + df)) + 1.0
+        qw = (1.0 + np.log(counts)) * idf * idf
+
+        hit_rows, hit_vals = [], []
+        for starts, ends, rows, vals in spans:
+            for s, e, w in zip(starts.tolist(), ends.tolist(), qw):
+                if s != e:
+                    hit_rows.append(rows[s:e])
+                    hit_vals.append(vals[s:e] * w)
+        if hit_rows:
+            hit_rows, hit_vals = np.concatenate(hit_rows), np.concatenate(hit_vals)
+            if len(hit_rows) * 8 > self.n_docs:
+                # dense accumulation beats sorting once postings are long
+                dense = np.bincount(hit_rows, weights=hit_vals, minlength=self.n_docs)
+                uniq = np.flatnonzero(np.bincount(hit_rows, minlength=self.n_docs))
+                sims = dense[uniq]
+            else:
+                uniq, inv = np.unique(hit_rows, return_inverse=True)
+                sims = np.bincount(inv, weights=hit_vals)
+        else:
+            uniq, sims = np.empty(0, dtype=np.int64), np.empty(0)
+
+        prior, by_prior = self._priors()
+        if candidates is not None:
+            # sorted and unique, as get_filtered_ids returns them
+            cand = np.asarray(candidates, dtype=np.int64)
+            found = _in_sorted(cand, uniq)
+            hits, hit_sims = uniq[found].astype(np.int64), sims[found]
+            if not len(cand):
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        elif len(uniq):
+            cand, hits, hit_sims = None, uniq.astype(np.int64), sims
+        else:
+            cand, hits, hit_sims = np.arange(self.n_docs), np.empty(0, dtype=np.int64), np.empty(0)
+
+        top_sim = hit_sims.max() if len(hits) else 0
+        if top_sim > 0:
+            hit_sims = hit_sims / top_sim
+        rows = hits
+        scores = (1 - engagement_weight) * hit_sims + engagement_weight * prior[hits]
+        if cand is not None:
+            # candidates without a matching term score on the prior alone:
+            # take the k best of them in prior order instead of scoring all
+            rest = self._top_by_prior(by_prior, cand, hits, k)
+            rows = np.concatenate([rows, rest])
+            scores = np.concatenate([scores, engagement_weight * prior[rest]])
+
+        k = min(k, len(rows))
+        order = np.lexsort((rows, -scores))[:k]
+        return rows[order], scores[order].astype(np.float32)
+
+    def _priors(self) -> tuple[np.ndarray, np.ndarray]:
+        """Normalised engagement prior and rows in descending prior order (cached)."""
+        if self._prior is None:
+            prior = np.log1p(np.maximum(self.engagement, 0))
+            prior = prior / max(prior.max(initial=0), 1e-9)
+            self._prior, self._by_prior = prior, np.argsort(-prior, kind="stable")
+        return self._prior, self._by_prior
+
+    @staticmethod
+    def _top_by_prior(by_prior: np.ndarray, cand: np.ndarray, exclude: np.ndarray, k: int) -> np.ndarray:
+        """First k rows of by_prior that are in sorted cand and not in exclude."""
+        found, start, step = [], 0, max(4 * k, 64)
+        need = k
+        while need > 0 and start < len(by_prior):
+            chunk = by_prior[start:start + step]
+            chunk = chunk[_in_sorted(cand, chunk) & ~_in_sorted(exclude, chunk)]
+            found.append(chunk[:need])
+            need -= len(found[-1])
+            start += step
+            step *= 2
+        return np.concatenate(found).astype(np.int64) if found else np.empty(0, dtype=np.int64)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [self.engagement, self.text_crc, *(a for segment in self._segments for a in segment)]
+        if self._prior is not None:
+            arrays += [self._prior, self._by_prior]
+        return sum(a.nbytes for a in arrays)
+
+    def _merged(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        if len(self._segments) == 1:
+            return self._segments[0]
+        if not self._segments:
+            return _segment(np.zeros(0, np.int64), np.zeros(0, np.int32), np.zeros(0, np.float32))
+        feats = np.concatenate([np.repeat(keys, np.diff(ptr)) for keys, ptr, _, _ in self._segments])
+        rows = np.concatenate([r for _, _, r, _ in self._segments])
+        vals = np.concatenate([v for _, _, _, v in self._segments])
+        order = np.lexsort((rows, feats))
+        return _segment(feats[order], rows[order], vals[order])
+
+    def save(self, path: str | Path) -> None:
+        keys, ptr, rows, vals = self._merged()
+        self._segments = [(keys, ptr, rows, vals)]
+        with open(path, "wb") as f:
+            np.savez(f, keys=keys, ptr=ptr, rows=rows, vals=vals,
+                     engagement=self.engagement, text_crc=self.text_crc)
+
+    @classmethod
+    def load(cls, path: str | Path) -> PostIndex:
+        index = cls()
+        with np.load(path) as z:
+            # indexes saved before the sparse layout have no keys: rebuilt by load_or_build
+            index._segments = [(z["keys"], z["ptr"], z["rows"], z["vals"])]
+            index.engagement = z["engagement"]
+            index.text_crc = z["text_crc"]
+        index.n_docs = len(index.text_crc)
+        return index
+
+    @classmethod
+    def load_or_build(cls, path: str | Path, texts: list[str],
+                      engagement: Iterable | None = None) -> PostIndex:
+        """
+        Load the persisted index for this corpus. If it covers a prefix of
+        the current texts only the new posts are appended; if it doesn't
+        match at all it is rebuilt. The result is written back when changed.
+        """
+        texts = list(texts)
+        engagement = None if engagement is None else list(engagement)
+
+        def load(path: Path) -> PostIndex | None:
+            try:
+                return cls.load(path) if path.exists() else None
+            except Exception:
+                return None
+
+        return load_or_extend(
+            Path(path), texts, load,
+            build=lambda: cls.build(texts, engagement),
+            append=lambda index, n: index.append(texts[n:], None if engagement is None else engagement[n:]),
+        )
@@ -0,0 +1,274 @@
+# Copyright 2025 Shreya Kamalapurkar
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# data/service.py
+# Headless HTTP API for the post generator (no Streamlit):
+#   python data/service.py --workers 4 --port 8000
+#   POST /generate         {"length": "Long", "language": "English", "tag": "Productivity"}
+#                          optional "tenant": "<id>" selects data/tenants/<id>/processed_posts.json
+#   POST /generate/batch   {"items": [{...}, ...]}
+#   POST /generate/stream  same body as /generate, streams text/plain
+#   GET  /healthz, /readyz, /metrics
+# Each worker process loads the corpus once at startup. Requests beyond
+# SERVICE_MAX_ACTIVE running + SERVICE_MAX_QUEUE waiting get a 429.
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import os
+from pathlib import Path
+
+from starlette.applications import Starlette
+from starlette.concurrency import iterate_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+import metrics
+from few_shot import get_few_shot, registry_stats
+from llm_helper import get_pool, is_retryable
+from post_generator import generate_post, parse_spec, stream_post, warm_prompts
+
+DATA_DIR = Path(__file__).parent
+MAX_ACTIVE = int(os.getenv("SERVICE_MAX_ACTIVE", "8"))
+MAX_QUEUE = int(os.getenv("SERVICE_MAX_QUEUE", "32"))
+MAX_BATCH = int(os.getenv("SERVICE_MAX_BATCH", "50"))
+RETRY_AFTER = "1"
+
+class Overloaded(Exception):
+    pass
+
+class Admission:
+    """
+    At most max_active generations run at once and at most max_queue wait
+    for a turn; anything beyond that is refused straight away (429) instead
+    of queueing without bound.
+    """
+    def __init__(self, max_active: int, max_queue: int):
+        self.max_active = max_active
+        self.max_pending = max_active + max_queue
+        self.pending = 0
+        self._sem = asyncio.Semaphore(max_active)
+
+    def reserve(self, n: int = 1) -> None:
+        if self.pending + n > self.max_pending:
+            metrics.incr("service_rejected", n)
+            raise Overloaded()
+        self.pending += n
+
+    def release(self, n: int = 1) -> None:
+        self.pending -= n
+
+    @contextlib.asynccontextmanager
+    async def turn(self):
+        """Run slot for an already reserved request."""
+        async with self._sem:
+            yield
+
+def _flag(body: dict, name: str) -> bool:
+    value = body.get(name, True)
+    if not isinstance(value, bool):
+        raise ValueError(f"{name} must be true or false")
+    return value
+
+def _parse_spec(body) -> dict:
+    spec = parse_spec(body)
+    spec["enforce_length"] = _flag(body, "enforce_length")
+    spec["use_cache"] = _flag(body, "use_cache")
+    return spec
+
+def _error_status(exc: Exception) -> int:
+    if isinstance(exc, TimeoutError):
+        return 504
+    return 503 if is_retryable(exc) else 502
+
+def _overloaded() -> JSONResponse:
+    return JSONResponse({"error": "overloaded"}, status_code=429, headers={"Retry-After": RETRY_AFTER})
+
+async def _body(request: Request):
+    try:
+        return await request.json()
+    except ValueError:
+        raise ValueError("body must be JSON")
+
+async def _generate(admission: Admission, spec: dict) -> str:
+    async with admission.turn():
+        with metrics.span("service.generate"):
+            return await asyncio.to_thread(
+                generate_post, spec["length"], spec["language"], spec["tag"],
+                spec["enforce_length"], spec["use_cache"], tenant=spec["tenant"],
+            )
+
+async def generate(request: Request):
+    try:
+        spec = _parse_spec(await _body(request))
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=422)
+    admission = request.app.state.admission
+    try:
+        admission.reserve()
+    except Overloaded:
+        return _overloaded()
+    try:
+        return JSONResponse({"post": await _generate(admission, spec)})
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=_error_status(e))
+    finally:
+        admission.release()
+
+async def generate_batch(request: Request):
+    admission = request.app.state.admission
+    # a batch is admitted all or nothing, so it can never exceed max_pending
+    max_batch = min(MAX_BATCH, admission.max_pending)
+    try:
+        body = await _body(request)
+        items = body.get("items") if isinstance(body, dict) else None
+        if not isinstance(items, list) or not items:
+            raise ValueError("items must be a non-empty list")
+        if len(items) > max_batch:
+            raise ValueError(f"at most {max_batch} items per batch")
+        specs = [_parse_spec(item) for item in items]
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=422)
+    try:
+        admission.reserve(len(specs))  # all or nothing
+    except Overloaded:
+        return _overloaded()
+
+    async def one(spec: dict) -> dict:
+        try:
+            return {"post": await _generate(admission, spec)}
+        except Exception as e:
+            return {"error": str(e), "status": _error_status(e)}
+        finally:
+            admission.release()
+
+    return JSONResponse({"posts": await asyncio.gather(*(one(spec) for spec in specs))})
+
+def _close_stream(gen) -> None:
+    with contextlib.suppress(ValueError):  # still running in a worker thread
+        gen.close()
+
+class _ReleasingStream(StreamingResponse):
+    """
+    StreamingResponse that runs release() once sending stops, including when
+    the client is gone before the body starts (BackgroundTask is skipped then).
+    """
+    def __init__(self, content, release, **kwargs):
+        super().__init__(content, **kwargs)
+        self._release = release
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self._release()
+
+async def generate_stream(request: Request):
+    try:
+        spec = _parse_spec(await _body(request))
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=422)
+    admission = request.app.state.admission
+    try:
+        admission.reserve()
+    except Overloaded:
+        return _overloaded()
+
+    # held until the response is done, however it ends
+    held = contextlib.AsyncExitStack()
+    held.callback(admission.release)
+    try:
+        await held.enter_async_context(admission.turn())
+        gen = stream_post(spec["length"], spec["language"], spec["tag"],
+                          spec["enforce_length"], spec["use_cache"], tenant=spec["tenant"])
+        held.callback(_close_stream, gen)
+        chunks = iterate_in_threadpool(gen)
+        # upstream errors surface here, before any status line is sent
+        first = await anext(chunks, "")
+    except Exception as e:
+        await held.aclose()
+        return JSONResponse({"error": str(e)}, status_code=_error_status(e))
+    except BaseException:
+        await held.aclose()
+        raise
+
+    async def body():
+        if first:
+            yield first
+        async for text in chunks:
+            yield text
+
+    return _ReleasingStream(body(), held.aclose, media_type="text/plain; charset=utf-8")
+
+async def healthz(request: Request):
+    return JSONResponse({"status": "ok"})
+
+async def readyz(request: Request):
+    state = request.app.state
+    if not state.ready:
+        return JSONResponse({"status": "loading"}, status_code=503)
+    admission = state.admission
+    return JSONResponse({
+        "status": "ready",
+        "posts": state.posts,
+        "pending": admission.pending,
+        "max_pending": admission.max_pending,
+        "llm": get_pool().stats(),
+        "corpora": registry_stats(),
+    })
+
+async def metrics_endpoint(request: Request):
+    return PlainTextResponse(metrics.export_prometheus(), media_type="text/plain; version=0.0.4")
+
+@contextlib.asynccontextmanager
+async def lifespan(app: Starlette):
+    app.state.ready = False
+    app.state.posts = 0
+    app.state.admission = Admission(MAX_ACTIVE, MAX_QUEUE)
+
+    def load():
+        fs = get_few_shot()
+        warm_prompts()
+        return 0 if fs.df is None else len(fs.df)
+
+    # load in the background so /healthz answers while the corpus loads
+    async def warm():
+        app.state.posts = await asyncio.to_thread(load)
+        app.state.ready = True
+
+    task = asyncio.create_task(warm())
+    yield
+    task.cancel()
+
+app = Starlette(
+    routes=[
+        Route("/generate", generate, methods=["POST"]),
+        Route("/generate/batch", generate_batch, methods=["POST"]),
+        Route("/generate/stream", generate_stream, methods=["POST"]),
+        Route("/healthz", healthz),
+        Route("/readyz", readyz),
+        Route("/metrics", metrics_endpoint),
+    ],
+    lifespan=lifespan,
+)
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the post generator over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="worker processes, each with its own corpus")
+    args = parser.parse_args()
+    uvicorn.run("service:app", host=args.host, port=args.port, workers=args.workers,
+                app_dir=str(DATA_DIR), log_level="warning")
@@ -0,0 +1,45 @@
+# Copyright 2025 Shreya Kamalapurkar
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# data/tenants.py
+# Where each tenant's corpus lives:
+#   data/processed_posts.json                       default (no tenant)
+#   data/tenants/<tenant>/processed_posts.json      one shard per tenant
+#   data/tenants/<tenant>/raw_posts.json
+# Standard library only, so the UI can resolve paths before pandas is loaded.
+from __future__ import annotations
+
+import re
+from pathlib import Path
+
+DATA_DIR = Path(__file__).parent
+TENANTS_DIR = DATA_DIR / "tenants"
+_TENANT_ID = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]{0,63}")
+
+def tenant_dir(tenant: str | None) -> Path:
+    """Directory holding tenant's corpus files (DATA_DIR for the default tenant)."""
+    if not tenant:
+        return DATA_DIR
+    if not _TENANT_ID.fullmatch(tenant) or ".." in tenant:
+        raise ValueError(f"invalid tenant id: {tenant!r}")
+    return TENANTS_DIR / tenant
+
+def corpus_path(tenant: str | None = None) -> Path:
+    return tenant_dir(tenant) / "processed_posts.json"
+
+def raw_path(tenant: str | None = None) -> Path:
+    return tenant_dir(tenant) / "raw_posts.json"
+
+def list_tenants() -> list[str]:
+    if not TENANTS_DIR.is_dir():
+        return []
+    return sorted(p.name for p in TENANTS_DIR.iterdir() if _TENANT_ID.fullmatch(p.name)
+                  and ((p / "processed_posts.json").exists() or (p / "raw_posts.json").exists()))
@@ -0,0 +1,20 @@
+# Copyright 2025 Shreya Kamalapurkar
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# tests/conftest.py
+# The data/ modules import each other by bare name; put them on the path and
+# keep every test on the offline fake LLM.
+import os
+import sys
+from pathlib import Path
+
+os.environ["LLM_BACKEND"] = "fake"
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "data"))
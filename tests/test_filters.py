@@ -0,0 +1,37 @@
+# Copyright 2025 Shreya Kamalapurkar
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# tests/test_filters.py
+# Postings lookups must select exactly the rows the old .apply scans did.
+from itertools import combinations, product
+
+import pytest
+
+import few_shot
+from bench import LENGTHS, filter_corpus, reference_filter
+
+@pytest.fixture(scope="module")
+def fs(tmp_path_factory):
+    return few_shot.FewShotPosts(filter_corpus(2000, tmp_path_factory.mktemp("filters")))
+
+def test_every_filter_matches_reference(fs):
+    tags = sorted(fs.get_tags())
+    tag_sets = [()] + [(t,) for t in tags] + list(combinations(tags, 2)) + [("No Such Tag",)]
+    for length, language, tag_set, match in product(
+            (*LENGTHS, None), ("English", "Hinglish", None), tag_sets, ("any", "all")):
+        got = fs.get_filtered_posts(length, language, *tag_set, match=match).index
+        expected = reference_filter(fs.df, length, language, *tag_set, match=match).index
+        assert got.equals(expected), (length, language, tag_set, match)
+
+def test_first_match_falls_back(fs):
+    ids = fs.get_first_match(("Long", "English", "No Such Tag"), ("Long", "English"))
+    assert ids.tolist() == fs.get_filtered_ids("Long", "English").tolist()
+    assert len(ids)
@@ -0,0 +1,60 @@
+# Copyright 2025 Shreya Kamalapurkar
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# tests/test_llm_pool.py
+# Per-call deadlines and slot bookkeeping of LLMPool on every call path.
+import asyncio
+import time
+
+import pytest
+
+from fake_llm import FakeChatModel
+from llm_helper import LLMPool
+
+GENERATE = "Length: Short\nTopic: Habits"
+
+def _pool(latency: float, tps: float = 0.0) -> LLMPool:
+    return LLMPool(factory=lambda: FakeChatModel(latency=f"fixed:{latency}", tokens_per_second=tps),
+                   max_in_flight=2)
+
+def _wait_idle(pool: LLMPool, limit: float = 3.0) -> None:
+    end = time.monotonic() + limit
+    while pool.stats()["in_flight"] and time.monotonic() < end:
+        time.sleep(0.02)
+    assert pool.stats()["in_flight"] == 0
+
+@pytest.mark.parametrize("call", [
+    lambda pool: pool.invoke(GENERATE, timeout=0.1),
+    lambda pool: list(pool.stream(GENERATE, timeout=0.1)),
+    lambda pool: asyncio.run(pool.ainvoke(GENERATE, timeout=0.1)),
+])
+def test_call_deadline(call):
+    pool = _pool(latency=0.5)
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        call(pool)
+    assert time.monotonic() - start < 0.3
+    assert pool.stats()["timeouts"] == 1
+    _wait_idle(pool)  # the overrunning request still frees its slot
+
+def test_stream_deadline_covers_the_whole_stream():
+    pool = _pool(latency=0.0, tps=40)
+    with pytest.raises(TimeoutError):
+        list(pool.stream(GENERATE, timeout=0.3))
+    _wait_idle(pool)
+
+def test_closed_stream_frees_its_slot():
+    pool = _pool(latency=0.0, tps=100)
+    chunks = pool.stream(GENERATE)
+    next(chunks)
+    chunks.close()
+    _wait_idle(pool)
+    assert pool.invoke(GENERATE).content
@@ -0,0 +1,66 @@
+# Copyright 2025 Shreya Kamalapurkar
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# tests/test_packed.py
+# Packed metadata extraction must return exactly what one post per request does.
+import asyncio
+import json
+
+import orjson
+import pytest
+from langchain_core.messages import AIMessage
+
+import preprocess
+from bench import CountingLLM, make_corpus
+from fake_llm import FakeChatModel
+
+@pytest.fixture(scope="module")
+def posts(tmp_path_factory):
+    raw_path, _ = make_corpus(300, tmp_path_factory.mktemp("packed"))
+    return [p["text"] for p in orjson.loads(raw_path.read_bytes())]
+
+class FlakyPackLLM:
+    """Fake model that truncates big packs and drops one answer from the others."""
+    def __init__(self):
+        self.llm = FakeChatModel()
+
+    async def ainvoke(self, prompt: str, **kwargs):
+        response = await self.llm.ainvoke(prompt, **kwargs)
+        if '<post id="1">' not in prompt:
+            return response
+        if prompt.count("<post id=") > 4:
+            return AIMessage(content=response.content[:50], response_metadata={"finish_reason": "length"})
+        return AIMessage(content=json.dumps(json.loads(response.content)[1:]),
+                         response_metadata={"finish_reason": "stop"})
+
+def _extract(extract, posts, llm, **kwargs):
+    return asyncio.run(extract(posts, llm, **kwargs))
+
+def test_packed_matches_single(posts):
+    single, packed = CountingLLM(FakeChatModel()), CountingLLM(FakeChatModel())
+    expected = _extract(preprocess.extract_metadata_concurrent, posts, single)
+    assert _extract(preprocess.extract_metadata_packed, posts, packed) == expected
+    assert packed.requests < single.requests / 4
+
+@pytest.mark.parametrize("pack_tokens", [1, 200, 100000])
+def test_pack_sizes(posts, pack_tokens):
+    expected = _extract(preprocess.extract_metadata_concurrent, posts[:60], FakeChatModel())
+    got = _extract(preprocess.extract_metadata_packed, posts[:60], FakeChatModel(), pack_tokens=pack_tokens)
+    assert got == expected
+
+def test_truncated_and_partial_answers_are_retried(posts):
+    expected = _extract(preprocess.extract_metadata_concurrent, posts[:80], FakeChatModel())
+    assert _extract(preprocess.extract_metadata_packed, posts[:80], FlakyPackLLM()) == expected
+
+def test_pack_posts_bounds():
+    packs = preprocess._pack_posts(["x" * 400] * 50, pack_tokens=1000, max_posts=8)
+    assert [i for pack in packs for i in pack] == list(range(50))
+    assert all(len(pack) <= 8 and len(pack) * 101 <= 1000 for pack in packs)
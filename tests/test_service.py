@@ -0,0 +1,87 @@
+# Copyright 2025 Shreya Kamalapurkar
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# tests/test_service.py
+# Request validation and admission bookkeeping of the HTTP service; generation
+# itself is stubbed out, so no corpus is loaded.
+import asyncio
+import json
+
+import pytest
+from starlette.testclient import TestClient
+
+import service
+from fake_llm import FakeAPIError
+
+SPEC = {"length": "Short", "language": "English", "tag": "Productivity"}
+
+@pytest.fixture
+def admission():
+    service.app.state.admission = service.Admission(max_active=2, max_queue=3)
+    return service.app.state.admission
+
+@pytest.fixture
+def client(admission):
+    return TestClient(service.app)
+
+def _stream(*chunks, error=None):
+    def stream_post(*args, **kwargs):
+        if error is not None:
+            raise error
+        yield from chunks
+    return stream_post
+
+@pytest.mark.parametrize("field", ["enforce_length", "use_cache"])
+@pytest.mark.parametrize("value", ["false", 0, 1, None])
+def test_flags_must_be_booleans(client, field, value):
+    response = client.post("/generate", json=SPEC | {field: value})
+    assert response.status_code == 422
+    assert field in response.json()["error"]
+
+def test_batch_larger_than_admission_is_rejected(client, admission):
+    response = client.post("/generate/batch", json={"items": [SPEC] * (admission.max_pending + 1)})
+    assert response.status_code == 422
+    assert admission.pending == 0
+
+def test_stream_upstream_error_maps_to_status(client, admission, monkeypatch):
+    monkeypatch.setattr(service, "stream_post", _stream(error=FakeAPIError(429)))
+    assert client.post("/generate/stream", json=SPEC).status_code == 503
+    monkeypatch.setattr(service, "stream_post", _stream(error=TimeoutError()))
+    assert client.post("/generate/stream", json=SPEC).status_code == 504
+    assert admission.pending == 0
+
+def test_stream_releases_after_body(client, admission, monkeypatch):
+    monkeypatch.setattr(service, "stream_post", _stream("Work ", "hard."))
+    response = client.post("/generate/stream", json=SPEC)
+    assert response.status_code == 200 and response.text == "Work hard."
+    assert admission.pending == 0
+
+def test_stream_releases_when_client_is_gone_before_start(admission, monkeypatch):
+    monkeypatch.setattr(service, "stream_post", _stream("Work ", "hard."))
+    body = json.dumps(SPEC).encode()
+    scope = {"type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"}, "http_version": "1.1",
+             "method": "POST", "path": "/generate/stream", "raw_path": b"/generate/stream",
+             "query_string": b"", "headers": [(b"content-type", b"application/json")],
+             "client": ("test", 1), "server": ("test", 80), "scheme": "http", "root_path": ""}
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            raise OSError("client disconnected")
+
+    async def call():
+        with pytest.raises(Exception):
+            await service.app(scope, receive, send)
+
+    asyncio.run(call())
+    assert admission.pending == 0
@@ -0,0 +1,42 @@
+# Copyright 2025 Shreya Kamalapurkar
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# tests/test_stream_cleaner.py
+# Streamed cleaning must show exactly what _clean_output makes of the whole
+# completion, however it is chunked, in every length mode.
+import random
+
+import pytest
+
+from post_generator import StreamCleaner, _clean_output
+
+ATOMS = ["a", "bc", "x y", " ", "  ", "\t", "\n", "\n\n", "\r\n", "\r\n\r\n", " \r\n",
+         "Here's", "Here", "This is", "This", "Below is"]
+
+def _streamed(text: str, length: str, enforce_length: bool, rng: random.Random) -> str:
+    cleaner, out, i = StreamCleaner(length, enforce_length), [], 0
+    while i < len(text) and not cleaner.done:
+        j = i + rng.randint(1, 6)
+        out.append(cleaner.feed(text[i:j]))
+        i = j
+    return "".join(out) + cleaner.finish()
+
+@pytest.mark.parametrize("enforce_length", [True, False])
+@pytest.mark.parametrize("length", ["Short", "Medium", "Long", "Unknown"])
+def test_stream_matches_clean_output(length, enforce_length):
+    rng = random.Random(f"{length}{enforce_length}")
+    for _ in range(3000):
+        text = "".join(rng.choice(ATOMS) for _ in range(rng.randint(0, 40)))
+        assert _streamed(text, length, enforce_length, rng) == _clean_output(text, length, enforce_length), repr(text)
+
+def test_crlf_becomes_lf_without_a_cap():
+    text = "Here's a post\r\nFirst line\r\n\r\nSecond line\r\n"
+    assert _streamed(text, "Long", False, random.Random(0)) == "First line\n\nSecond line"
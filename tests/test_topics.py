@@ -0,0 +1,44 @@
+# Copyright 2025 Shreya Kamalapurkar
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# tests/test_topics.py
+# few_shot._infer_topics must label every text exactly like the per-rule loop.
+import pandas as pd
+import pytest
+
+import few_shot
+from bench import reference_topic, topic_texts
+
+DTYPES = [object, "str", "string[pyarrow]"]
+
+def _check(texts: list[str], dtype) -> None:
+    got = few_shot._infer_topics(pd.Series(texts, dtype=dtype)).tolist()
+    expected = [reference_topic(t) for t in texts]
+    diffs = [(t, g, e) for t, g, e in zip(texts, got, expected) if g != e]
+    assert not diffs, diffs[:5]
+
+@pytest.mark.parametrize("dtype", DTYPES)
+@pytest.mark.parametrize("space", ["\xa0", " ", "\x85", "\x1c", "\v", "\r\n", "\u3000", "\u200b"])
+def test_unicode_space_inside_rule(space, dtype):
+    _check([f"burnt{space}out", f"I was BURNT{space}{space}OUT", f"team{space}work"], dtype)
+
+@pytest.mark.parametrize("dtype", DTYPES)
+def test_every_bmp_character_around_keywords(dtype):
+    chars = [chr(c) for c in range(0x80, 0x10000) if not 0xD800 <= c < 0xE000]
+    texts = [f"burnt{c}out" for c in chars] + [f"{c}team{c}" for c in chars] + [f"work{c}s" for c in chars]
+    _check(texts, dtype)
+
+@pytest.mark.parametrize("dtype", DTYPES)
+def test_synthetic_posts(dtype):
+    _check(topic_texts(5000), dtype)
+
+def test_missing_text_is_general():
+    assert few_shot._infer_topics(pd.Series([None, ""], dtype=object)).tolist() == ["General"] * 2